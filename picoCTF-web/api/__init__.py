@@ -129,7 +129,9 @@ def create_app(config=None):
         response.headers.add("Access-Control-Allow-Credentials", "true")
         response.headers.add("Access-Control-Allow-Headers", "Content-Type, *")
         response.headers.add("Cache-Control", "no-cache")
-        response.headers.add("Cache-Control", "no-store")
+        # Responses with an ETag may be kept by the client for revalidation
+        if response.get_etag()[0] is None:
+            response.headers.add("Cache-Control", "no-store")
         with app.app_context():
             if app.debug:
                 response.headers.add("Access-Control-Allow-Origin", "*")
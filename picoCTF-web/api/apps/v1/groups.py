@@ -36,6 +36,7 @@ from .schemas import (
     score_progressions_req,
     scoreboard_page_req,
 )
+from .scoreboards import scoreboard_page_response
 
 ns = Namespace("groups", description="Group management")
 
@@ -554,11 +555,10 @@ class ScoreboardPage(Resource):
             page = api.stats.get_filtered_scoreboard_page(
                 {"group_id": group_id}, req["search"], req["page"] or 1
             )
-        else:
-            page = api.stats.get_scoreboard_page({"group_id": group_id}, req["page"])
-        return jsonify(
-            {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
-        )
+            return jsonify(
+                {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
+            )
+        return scoreboard_page_response({"group_id": group_id}, req["page"])
 
 
 @ns.route("/<string:group_id>/score_progressions")
@@ -71,6 +71,7 @@ class MinigameSubmissionResponse(Resource):
                     "$inc": {"tokens": tokens_earned},
                 },
             )
+            api.cache.drop_request_cached("user")
 
         return jsonify(
             {
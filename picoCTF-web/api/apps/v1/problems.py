@@ -59,26 +59,20 @@ class ProblemList(Resource):
         if req["category"] == "":
             req["category"] = None
 
-        # To begin, get all problems, filtered by category and include_disabled
+        curr_user = api.user.get_user()
+        is_teacher = curr_user.get("teacher", False)
+        is_admin = curr_user.get("admin", False)
+
+        # To begin, get all problems, filtered by category and include_disabled.
+        # Only admins listing every problem see all of their instances.
         problems = api.problem.get_all_problems(
-            category=req["category"], show_disabled=req["include_disabled"]
+            category=req["category"],
+            show_disabled=req["include_disabled"],
+            include_instances=is_admin and req["unlocked_only"] is False,
         )
 
         # Add the unlocked, solved, review, and container fields
-        curr_user = api.user.get_user()
-        for problem in problems:
-            pid = problem["pid"]
-            tid = curr_user["tid"]
-            problem["solves"] = api.stats.get_problem_solves(pid)
-            problem["unlocked"] = pid in api.problem.get_unlocked_pids(tid)
-            problem["solved"] = pid in api.problem.get_solved_pids(tid=tid)
-            if curr_user.get("admin", False):
-                problem["reviews"] = api.problem_feedback.get_problem_feedback(
-                    pid=pid, count_only=True
-                )
-            containers = api.docker.submission_to_cid(tid, pid)
-            if containers.count() > 0:
-                problem["container"] = dict(containers.next())
+        api.problem.annotate_problems(problems, curr_user["tid"], reviews=is_admin)
 
         # Handle the solved_only param
         if req["solved_only"]:
@@ -86,8 +80,6 @@ class ProblemList(Resource):
 
         # Handle the unlocked_only param, which depends on user role
         # Unless just getting the count - then normal users allowed
-        is_teacher = api.user.get_user().get("teacher", False)
-        is_admin = api.user.get_user().get("admin", False)
         if req["unlocked_only"] is False:
             if req["count_only"] is False and not is_teacher and not is_admin:
                 raise PicoException(
@@ -106,8 +98,10 @@ class ProblemList(Resource):
             # that have not been unlocked by the current user's team.
             problems = [p for p in problems if (p["unlocked"] is True)]
             # Additionally, show only fields from the assigned instance.
+            tid = curr_user["tid"]
+            instance_map = api.team.get_team(tid=tid)["instances"]
             problems = [
-                api.problem.filter_problem_instances(p, api.user.get_user()["tid"])
+                api.problem.filter_problem_instances(p, tid, instance_map)
                 for p in problems
             ]
             # Strip out admin-only fields
@@ -179,13 +173,15 @@ class Problem(Resource):
 
     def get(self, problem_id):
         """Retrieve a specific problem."""
-        # Ensure that the problem exists
-        problem = api.problem.get_problem(problem_id)
+        # Ensure that the problem exists. Only admins see all of its instances.
+        curr_user = api.user.get_user()
+        problem = api.problem.get_problem(
+            problem_id, None if curr_user.get("admin", False) else {"instances": 0}
+        )
         if not problem:
             raise PicoException("Problem not found", status_code=404)
 
         # Add synthetic fields
-        curr_user = api.user.get_user()
         problem["solves"] = api.stats.get_problem_solves(problem["pid"])
         problem["unlocked"] = problem["pid"] in api.problem.get_unlocked_pids(
             curr_user["tid"]
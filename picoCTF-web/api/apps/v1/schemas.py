@@ -728,6 +728,22 @@ score_progression_req.add_argument(
     help="Restrict score progression to this problem category",
     error="Category field must be a string",
 )
+score_progression_req.add_argument(
+    "since",
+    required=False,
+    type=inputs.natural,
+    location="args",
+    help="Only include solves after this unix timestamp",
+    error="Since must be a unix timestamp",
+)
+score_progression_req.add_argument(
+    "max_points",
+    required=False,
+    type=inputs.positive,
+    location="args",
+    help="Downsample the score progression to at most this many points",
+    error="Max points must be a positive integer",
+)
 
 # Team change request
 team_change_req = reqparse.RequestParser()
@@ -801,6 +817,41 @@ scoreboard_page_req.add_argument(
     error="Search pattern must be a string",
 )
 
+# Submission statistics request
+submission_stats_req = reqparse.RequestParser()
+submission_stats_req.add_argument(
+    "start",
+    required=False,
+    type=inputs.datetime_from_iso8601,
+    location="args",
+    help="Only count submissions made at or after this time",
+    error="Start must be an ISO 8601 time",
+)
+submission_stats_req.add_argument(
+    "end",
+    required=False,
+    type=inputs.datetime_from_iso8601,
+    location="args",
+    help="Only count submissions made before this time",
+    error="End must be an ISO 8601 time",
+)
+submission_stats_req.add_argument(
+    "category",
+    required=False,
+    type=str,
+    location="args",
+    help="Only count submissions to problems in this category",
+    error="Category field must be a string",
+)
+submission_stats_req.add_argument(
+    "by_category",
+    required=False,
+    type=inputs.boolean,
+    location="args",
+    default=False,
+    help="Break the statistics down by category instead of by problem",
+)
+
 # Score progressions request
 score_progressions_req = reqparse.RequestParser()
 score_progressions_req.add_argument(
@@ -993,3 +1044,15 @@ user_delete_req.add_argument(
     help="Deletion reason",
     error="The reason must be a string!",
 )
+
+# Analytics export request
+export_req = reqparse.RequestParser()
+export_req.add_argument(
+    "format",
+    required=False,
+    type=str,
+    location="args",
+    default="json",
+    choices=["json", "ndjson", "csv"],
+    help="Export as a JSON list, or stream as newline delimited JSON or CSV",
+)
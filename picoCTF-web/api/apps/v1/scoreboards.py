@@ -2,7 +2,7 @@
 
 import api
 from api import block_before_competition, PicoException, require_admin
-from flask import jsonify
+from flask import jsonify, request, Response
 from flask_restplus import Namespace, Resource
 
 from .schemas import score_progressions_req, scoreboard_page_req, scoreboard_req
@@ -77,13 +77,10 @@ class ScoreboardPage(Resource):
             page = api.stats.get_filtered_scoreboard_page(
                 {"scoreboard_id": scoreboard_id}, req["search"], req["page"] or 1
             )
-        else:
-            page = api.stats.get_scoreboard_page(
-                {"scoreboard_id": scoreboard_id}, req["page"]
+            return jsonify(
+                {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
             )
-        return jsonify(
-            {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
-        )
+        return scoreboard_page_response({"scoreboard_id": scoreboard_id}, req["page"])
 
 
 @ns.route("/<string:scoreboard_id>/score_progressions")
@@ -110,3 +107,27 @@ class ScoreProgressionsResult(Resource):
                 limit=(req["limit"] or 5), scoreboard_id=scoreboard_id
             )
         )
+
+
+def scoreboard_page_response(scoreboard_key, page_number):
+    """
+    Respond with a scoreboard page, or 304 if the client's copy is current.
+
+    Args:
+        scoreboard_key (dict): scoreboard key
+        page_number (int): page to retrieve, or None for the current team's
+    """
+    page_number, version = api.stats.get_scoreboard_page_version(
+        scoreboard_key, page_number
+    )
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+    else:
+        response = Response(
+            api.stats.get_rendered_scoreboard_page(
+                scoreboard_key, page_number, version
+            ),
+            mimetype="application/json",
+        )
+    response.set_etag(version)
+    return response
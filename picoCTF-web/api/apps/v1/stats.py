@@ -1,9 +1,15 @@
 """Endpoints for getting statistical reports."""
+import csv
+import io
+import json
+
 import api
 from api import require_admin
-from flask import jsonify
+from flask import jsonify, Response, stream_with_context
 from flask_restplus import Namespace, Resource
 
+from .schemas import export_req, submission_stats_req
+
 ns = Namespace("stats", "Statistical aggregations and reports")
 
 
@@ -24,12 +30,24 @@ class SubmissionStatistics(Resource):
     """View submission statistics, broken down by problem."""
 
     @require_admin
+    @ns.expect(submission_stats_req)
     def get(self):
         """Get submission statistics, broken down by problem name."""
+        req = submission_stats_req.parse_args(strict=True)
+        stats = api.stats.get_submission_stats(
+            group_by="category" if req["by_category"] else "pid",
+            start=req["start"],
+            end=req["end"],
+            category=req["category"],
+        )
+        if req["by_category"]:
+            return jsonify(stats)
         return jsonify(
             {
-                p["name"]: api.stats.get_problem_submission_stats(p["pid"])
-                for p in api.problem.get_all_problems(show_disabled=True)
+                p["name"]: stats.get(p["pid"], {"valid": 0, "invalid": 0})
+                for p in api.problem.get_all_problems(
+                    category=req["category"], show_disabled=True
+                )
             }
         )
 
@@ -42,6 +60,78 @@ class DemographicInformation(Resource):
     """Get demographic information used in analytics."""
 
     @require_admin
+    @ns.expect(export_req)
     def get(self):
         """Get demographic information used in analytics."""
-        return jsonify(api.stats.get_demographic_data())
+        req = export_req.parse_args(strict=True)
+        return _export(
+            api.stats.iter_demographic_data(),
+            req["format"],
+            "demographics",
+            ["usertype", "country", "gender", "zipcode", "grade", "score"],
+        )
+
+
+@ns.response(200, "Success")
+@ns.response(401, "Not logged in")
+@ns.response(403, "Not authorized")
+@ns.route("/user_scores")
+class UserScores(Resource):
+    """Get the score of every user."""
+
+    @require_admin
+    @ns.expect(export_req)
+    def get(self):
+        """Get the score of every user, highest first unless streamed."""
+        req = export_req.parse_args(strict=True)
+        if req["format"] == "json":
+            return jsonify(api.stats.get_all_user_scores())
+        return _export(
+            api.stats.iter_all_user_scores(),
+            req["format"],
+            "user_scores",
+            ["name", "score"],
+        )
+
+
+def _export(rows, export_format, name, fields):
+    """
+    Respond with analytics rows in the requested format.
+
+    NDJSON and CSV are streamed a row at a time as the rows are generated.
+
+    Args:
+        rows: iterable of dicts
+        export_format: json, ndjson or csv
+        name: base name of the downloaded file
+        fields: CSV columns
+    """
+    if export_format == "json":
+        return jsonify(list(rows))
+    if export_format == "ndjson":
+        body = (json.dumps(row) + "\n" for row in rows)
+        mimetype = "application/x-ndjson"
+    else:
+        body = _csv_lines(rows, fields)
+        mimetype = "text/csv"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": "attachment; filename={}.{}".format(
+                name, export_format
+            )
+        },
+    )
+
+
+def _csv_lines(rows, fields):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
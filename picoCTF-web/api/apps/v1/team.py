@@ -143,7 +143,11 @@ class ScoreProgression(Resource):
         if req["category"] == "":
             req["category"] = None
         current_tid = api.user.get_user()["tid"]
-        progress_kwargs = {"tid": current_tid}
+        progress_kwargs = {
+            "tid": current_tid,
+            "since": req["since"],
+            "max_points": req["max_points"],
+        }
         if req["category"] is not None:
             progress_kwargs["category"] = req["category"]
         return jsonify(api.stats.get_score_progression(**progress_kwargs))
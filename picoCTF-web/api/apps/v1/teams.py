@@ -85,6 +85,7 @@ class RecalculateAllEligibilitiesResponse(Resource):
             db.teams.find_one_and_update(
                 {"tid": team_id}, {"$set": {"eligibilities": team_eligibilities}}
             )
+            api.cache.drop_request_cached("team")
         return jsonify({"success": True})
 
 
@@ -145,5 +146,6 @@ class RecalculateEligibilitiesResponse(Resource):
         db.teams.find_one_and_update(
             {"tid": team_id}, {"$set": {"eligibilities": team_eligibilities}}
         )
+        api.cache.drop_request_cached("team")
 
         return jsonify({"success": True, "eligibilities": team_eligibilities})
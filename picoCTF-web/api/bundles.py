@@ -4,6 +4,7 @@ from voluptuous import Required, Schema
 
 import api
 from api import check, validate
+from api.cache import memoize
 
 bundle_schema = Schema(
     {
@@ -65,11 +66,11 @@ def upsert_bundle(bundle):
     existing = db.bundles.find_one({"bid": bid}, {"_id": 0})
     if existing is not None:
         db.bundles.find_one_and_update({"bid": bid}, {"$set": bundle})
-        return bid
-
-    bundle["bid"] = bid
-    bundle["dependencies_enabled"] = False
-    db.bundles.insert(bundle)
+    else:
+        bundle["bid"] = bid
+        bundle["dependencies_enabled"] = False
+        db.bundles.insert(bundle)
+    api.cache.invalidate(get_dependency_graph)
     return bid
 
 
@@ -94,5 +95,64 @@ def set_bundle_dependencies_enabled(bid, enabled):
     if not success:
         return None
     else:
+        api.cache.invalidate(get_dependency_graph)
         api.cache.clear()
         return bid
+
+
+@memoize(local=True)
+def get_dependency_graph():
+    """
+    Compile the enabled bundle dependencies into a reverse index.
+
+    Returns:
+        A dict with:
+            thresholds: for each problem unique_name with dependencies, a
+                        dict of bids to the weight needed to unlock it
+            dependents: for each problem unique_name, a list of
+                        [dependent unique_name, bid, weight] it counts
+                        towards
+
+    """
+    graph = {"thresholds": {}, "dependents": {}}
+    for bundle in get_all_bundles():
+        if "dependencies" not in bundle or not bundle["dependencies_enabled"]:
+            continue
+        bid = bundle["bid"]
+        for dependent, dependency in bundle["dependencies"].items():
+            graph["thresholds"].setdefault(dependent, {})[bid] = dependency["threshold"]
+            for name, weight in dependency["weightmap"].items():
+                graph["dependents"].setdefault(name, []).append(
+                    [dependent, bid, weight]
+                )
+    return graph
+
+
+def get_locked_problems(solved):
+    """
+    Get the problems which are still locked by bundle dependencies.
+
+    Only the dependents of the solved problems are visited, so the cost
+    grows with what has been solved rather than with the number of problems
+    and bundles.
+
+    Args:
+        solved: unique_names of the solved problems
+
+    Returns:
+        set of unique_names of the locked problems
+
+    """
+    graph = get_dependency_graph()
+    weightsums = {}
+    for name in solved:
+        for dependent, bid, weight in graph["dependents"].get(name, []):
+            weightsums[(dependent, bid)] = weightsums.get((dependent, bid), 0) + weight
+    return {
+        dependent
+        for dependent, thresholds in graph["thresholds"].items()
+        if any(
+            weightsums.get((dependent, bid), 0) < threshold
+            for bid, threshold in thresholds.items()
+        )
+    }
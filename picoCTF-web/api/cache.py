@@ -1,9 +1,20 @@
 """Caching Library using redis."""
 
+import copy
+import datetime
+import inspect
 import logging
+import math
+import os
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from string import Formatter
 
-from flask import current_app
+from flask import current_app, g, has_request_context
 from walrus import Walrus
 
 import api
@@ -11,14 +22,182 @@ import hashlib
 import pickle
 from api import PicoException
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 log = logging.getLogger(__name__)
 
+# Pub/sub channel used to keep per-worker local caches coherent
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Invalidation message which drops every local cache entry
+INVALIDATE_ALL = "*"
+
+# Deletes the members of each tag set in KEYS, then the sets themselves
+INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call("SMEMBERS", tag)) do
+        redis.call("DEL", key)
+        table.insert(deleted, key)
+    end
+    redis.call("DEL", tag)
+end
+return deleted
+"""
+
+# Deletes KEYS[1] only if it still holds the lock token ARGV[1]
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# Adds a newly solved problem ARGV[3] to each cached score in the ZSet
+# KEYS[1], for the members ARGV[4..] whose sets of counted pids are KEYS[2..]:
+# ARGV[1] points are added to the integer part and the time weight fraction
+# is replaced by ARGV[2]. The pid is recorded even for members without a
+# cached score, and scores which already count it are left alone.
+INCREMENT_SCORES_SCRIPT = """
+local points = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local updated = 0
+for i = 2, #KEYS do
+    local member = ARGV[i + 2]
+    if redis.call("SADD", KEYS[i], ARGV[3]) == 1 then
+        local score = redis.call("ZSCORE", KEYS[1], member)
+        if score then
+            score = math.floor(tonumber(score)) + points + weight
+            redis.call("ZADD", KEYS[1], score, member)
+            updated = updated + 1
+        end
+    end
+end
+return updated
+"""
+
+# Caches score ARGV[2] for member ARGV[1] in the ZSet KEYS[1], counting the
+# pids ARGV[3..], unless the set of pids KEYS[2] has a solve recorded since
+# which the score misses
+CACHE_SCORE_SCRIPT = """
+local counted = {}
+for i = 3, #ARGV do
+    counted[ARGV[i]] = true
+end
+for _, pid in ipairs(redis.call("SMEMBERS", KEYS[2])) do
+    if not counted[pid] then
+        return 0
+    end
+end
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+redis.call("DEL", KEYS[2])
+for i = 3, #ARGV do
+    redis.call("SADD", KEYS[2], ARGV[i])
+end
+return 1
+"""
+
+# Appends a newly solved problem ARGV[3] to each score progression list
+# KEYS[2i-1] which exists, unless it is already in the list's set of counted
+# pids KEYS[2i]: ARGV[2] points on top of the list's last score, at unix
+# time ARGV[1]. The pid is recorded for ARGV[4] seconds even for lists which
+# are not built. Entries are "time:score", after a PROGRESSION_START sentinel.
+APPEND_PROGRESSIONS_SCRIPT = """
+local appended = 0
+for i = 1, #KEYS, 2 do
+    local key = KEYS[i]
+    if redis.call("SADD", KEYS[i + 1], ARGV[3]) == 1 then
+        if redis.call("TTL", KEYS[i + 1]) < 0 then
+            redis.call("EXPIRE", KEYS[i + 1], ARGV[4])
+        end
+        local last = redis.call("LINDEX", key, -1)
+        if last then
+            local score = 0
+            local sep = string.find(last, ":")
+            if sep then
+                score = tonumber(string.sub(last, sep + 1))
+            end
+            score = score + tonumber(ARGV[2])
+            redis.call("RPUSH", key, string.format("%s:%d", ARGV[1], score))
+            appended = appended + 1
+        end
+    end
+end
+return appended
+"""
+
+# Replaces the score progression list KEYS[1] with the ARGV[2] pids ARGV[3..]
+# it counts and the entries after them, both expiring after ARGV[1] seconds,
+# unless the set of pids KEYS[2] has a solve recorded since which it misses
+CACHE_PROGRESSION_SCRIPT = """
+local count = tonumber(ARGV[2])
+local counted = {}
+for i = 3, count + 2 do
+    counted[ARGV[i]] = true
+end
+for _, pid in ipairs(redis.call("SMEMBERS", KEYS[2])) do
+    if not counted[pid] then
+        return 0
+    end
+end
+redis.call("DEL", KEYS[1], KEYS[2])
+for i = count + 3, #ARGV do
+    redis.call("RPUSH", KEYS[1], ARGV[i])
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+for i = 3, count + 2 do
+    redis.call("SADD", KEYS[2], ARGV[i])
+end
+redis.call("EXPIRE", KEYS[2], ARGV[1])
+return 1
+"""
+# First entry of every score progression list, so no list is ever empty
+PROGRESSION_START = "start"
+
+# Increments field ARGV[1] of the hash KEYS[1], only if the hash exists
+INCREMENT_IF_EXISTS_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 1 then
+    return redis.call("HINCRBY", KEYS[1], ARGV[1], 1)
+end
+return false
+"""
+
+# Length of the substrings of team names and affiliations indexed for search
+SEARCH_GRAM_LENGTH = 3
+
+# Defaults for single-flight recomputation: how long a lock is held at most,
+# and how long other callers wait for its holder before computing themselves
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+# Defaults for functions which opt into the in-process cache
+LOCAL_TIMEOUT = 60
+LOCAL_SIZE = 1024
+
+# Prefix of values stored with their compute and expiry times, ahead of the
+# codec marker. Distinct from both codec markers and pickle's own opcodes.
+ENVELOPE_MARKER = b"e"
+
 __redis = {
     "walrus": None,
     "cache": None,
     "zsets": {"scores": None},
+    "scripts": {},
+    "codec": None,
 }
 
+__local = {
+    "pid": None,
+    "listener": None,
+    "caches": {},
+}
+
+# Names of memoized functions that opted into the in-process cache
+__local_functions = set()
+
 
 def get_conn():
     """Get a redis connection, reusing one if it exists."""
@@ -63,13 +242,123 @@ def get_scoreboard_cache(**kwargs):
     return __redis["zsets"][scoreboard_name]
 
 
+def get_progression_key(tid=None, uid=None):
+    """Get the redis key of a team's or user's score progression list."""
+    if uid is None:
+        return "progression:team:{}".format(tid)
+    elif tid is None:
+        return "progression:user:{}".format(uid)
+    return "progression:team:{}:user:{}".format(tid, uid)
+
+
 def clear():
     global __redis
     if __redis.get("walrus") is not None:
         __redis["walrus"].flushdb()
+        _clear_local()
+        _publish_invalidation(INVALIDATE_ALL)
+
 
+class LocalCache(object):
+    """
+    Bounded, per-worker LRU cache with a TTL on each entry.
 
-def __insert_cache(f, *args, **kwargs):
+    Holds the serialized value exactly as stored in redis, so every hit
+    hands the caller a fresh copy just as a redis read would.
+    """
+
+    def __init__(self, size=LOCAL_SIZE, timeout=LOCAL_TIMEOUT):
+        """Initialize an empty cache holding at most size entries."""
+        self.size = size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Drop a single entry."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+def _get_local_cache(f, size, timeout):
+    """
+    Get the in-process cache for a memoized function, creating it if needed.
+
+    Also makes sure this worker is subscribed to invalidation messages.
+    Forked workers (gunicorn) start with fresh caches and their own listener.
+    """
+    if __local["pid"] != os.getpid():
+        __local["pid"] = os.getpid()
+        __local["listener"] = None
+        __local["caches"] = {}
+    if __local["listener"] is None:
+        pubsub = get_conn().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{INVALIDATION_CHANNEL: _handle_invalidation})
+        __local["listener"] = pubsub.run_in_thread(sleep_time=1, daemon=True)
+    if f.__name__ not in __local["caches"]:
+        __local["caches"][f.__name__] = LocalCache(size=size, timeout=timeout)
+    return __local["caches"][f.__name__]
+
+
+def _handle_invalidation(message):
+    """Apply an invalidation message published by any worker."""
+    for key in message["data"].decode("utf-8").split("\n"):
+        if key == INVALIDATE_ALL:
+            _clear_local()
+        else:
+            _delete_local(key)
+
+
+def _delete_local(key):
+    """Drop a memoized key from this worker's local cache, if present."""
+    local_cache = __local["caches"].get(key.split(":", 1)[0])
+    if local_cache is not None:
+        local_cache.delete(key)
+
+
+def _clear_local():
+    for local_cache in list(__local["caches"].values()):
+        local_cache.clear()
+
+
+def _publish_invalidation(*keys):
+    """Tell every other worker to drop keys from its local cache."""
+    keys = [
+        key
+        for key in keys
+        if key == INVALIDATE_ALL or key.split(":", 1)[0] in __local_functions
+    ]
+    if keys:
+        get_conn().publish(INVALIDATION_CHANNEL, "\n".join(keys))
+
+
+def __insert_cache(f, args, kwargs, tags=()):
     """
     Directly upserting without first invalidating, thus keeping a memoized
     value available without lapse
@@ -77,23 +366,219 @@ def __insert_cache(f, *args, **kwargs):
     if f == api.stats.get_score:
         raise PicoException("Error: Do not manually reset_cache get_score")
     else:
-        key = "%s:%s" % (f.__name__, _hash_key(args, kwargs))
-        value = f(*args, **kwargs)
-        get_cache().set(key, value)
+        key = _make_key(f, args, kwargs)
+        value, raw = _compute(f, args, kwargs, key, 0, tags)
+        _delete_local(key)
+        _publish_invalidation(key)
         return value
 
 
-def memoize(_f=None, **cached_kwargs):
-    """walrus.Cache.cached wrapper that reuses shared cache."""
+def _compute(f, args, kwargs, key, timeout, tags=()):
+    """
+    Call a memoized function and store its result.
+
+    The value is stored along with how long it took to compute and when it
+    expires, which early refreshes are scheduled from.
+
+    Returns:
+        (value, serialized value)
+    """
+    start = time.time()
+    value = f(*args, **kwargs)
+    delta = time.time() - start
+    expires = time.time() + timeout if timeout else None
+    raw = _pack(value, delta, expires)
+    _store(key, raw, timeout, tags)
+    return value, raw
+
+
+def _store(key, raw, timeout, tags=()):
+    """
+    Write a serialized value and record it under each of its tags.
+
+    Tag sets do not expire; they are dropped by invalidate_tags() or clear().
+    """
+    _cache = get_cache()
+    pipe = get_conn().pipeline(transaction=False)
+    if timeout:
+        pipe.setex(_cache.make_key(key), int(timeout), raw)
+    else:
+        pipe.set(_cache.make_key(key), raw)
+    for tag in tags:
+        pipe.sadd(_tag_key(tag), _cache.make_key(key))
+    pipe.execute()
+
+
+def _tag_key(tag):
+    return get_cache().make_key("tag:{}".format(tag))
+
+
+def _compile_tags(tags):
+    """Pair each tag template with the argument names it is formatted from."""
+    return [
+        (tag, [field for _, field, _, _ in Formatter().parse(tag) if field])
+        for tag in tags or []
+    ]
+
+
+def _resolve_tags(signature, compiled_tags, args, kwargs):
+    """
+    Format the tags of a memoized call from its arguments.
+
+    A tag is skipped if any argument it refers to is None, e.g.
+    "user:{uid}" for a call made with only a tid.
+    """
+    if not compiled_tags:
+        return []
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    resolved = []
+    for tag, fields in compiled_tags:
+        values = {field: bound.arguments.get(field) for field in fields}
+        if all(value is not None for value in values.values()):
+            resolved.append(tag.format(**values))
+    return resolved
+
+
+def _should_refresh(delta, expires, beta):
+    """
+    Decide whether to recompute a value before it expires (XFetch).
+
+    Recomputation becomes likelier the closer the value is to expiring and
+    the longer it took to compute, so that one caller usually refreshes it
+    before every caller misses at once.
+    """
+    if not beta or expires is None:
+        return False
+    return time.time() - delta * beta * math.log(random.random()) >= expires
+
+
+def _acquire_lock(key, lock_timeout):
+    """Try to take the single-flight lock for a key, returning its token."""
+    token = api.common.token()
+    if get_conn().set(_lock_key(key), token, nx=True, ex=lock_timeout):
+        return token
+    return None
+
+
+def _release_lock(key, token):
+    get_script("release_lock", RELEASE_LOCK_SCRIPT)(keys=[_lock_key(key)], args=[token])
+
+
+def _lock_key(key):
+    return get_cache().make_key("lock:{}".format(key))
+
+
+def _wait_for_value(key, wait):
+    """Poll for a value being computed by another caller, for up to wait s."""
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        raw = get_conn().get(get_cache().make_key(key))
+        if raw is not None:
+            return raw
+    return None
+
+
+def memoize(
+    _f=None,
+    timeout=None,
+    local=False,
+    local_timeout=LOCAL_TIMEOUT,
+    local_size=LOCAL_SIZE,
+    tags=None,
+    single_flight=False,
+    lock_timeout=LOCK_TIMEOUT,
+    lock_wait=LOCK_WAIT,
+    early_refresh=None,
+):
+    """
+    Memoize a function in the shared redis cache.
+
+    Values are stored under the function name and its encoded arguments (see
+    _encode_key), within the walrus cache prefix. Each value is wrapped in an
+    envelope with its compute and expiry times, serialized by the codec
+    selected by CACHE_CODEC (see _pack).
+
+    Args:
+        timeout: redis expiry in seconds, defaults to never expiring
+        local: also keep values in a bounded per-worker cache in front of
+               redis. Entries are dropped from every worker on invalidate()
+               or clear(), and expire after local_timeout regardless.
+        local_timeout: lifetime in seconds of a local cache entry
+        local_size: maximum number of local cache entries for this function
+        tags: entity tags formatted from the call's arguments, such as
+              "team:{tid}". Every cached value is recorded under its tags
+              so invalidate_tags() can drop it however the call was made.
+        single_flight: on a miss, only the caller holding a redis lock on
+                       the key recomputes it. Others wait up to lock_wait
+                       seconds for its result before computing it themselves.
+        lock_timeout: seconds after which an unreleased lock expires
+        lock_wait: seconds to wait for another caller's result
+        early_refresh: XFetch beta (1.0 is a good start). Values with a
+                       timeout are recomputed early, with a probability
+                       rising as expiry approaches. With single_flight,
+                       callers not holding the lock keep the current value.
+    """
 
     def decorator(f):
+        if local:
+            __local_functions.add(f.__name__)
+        signature = inspect.signature(f)
+        compiled_tags = _compile_tags(tags)
+
         @wraps(f)
         def wrapper(*args, **kwargs):
-            if kwargs.get("reset_cache", False):
-                kwargs.pop("reset_cache", None)
-                return __insert_cache(f, *args, **kwargs)
-            else:
-                return get_cache().cached(**cached_kwargs)(f)(*args, **kwargs)
+            if kwargs.pop("reset_cache", False):
+                return __insert_cache(
+                    f,
+                    args,
+                    kwargs,
+                    _resolve_tags(signature, compiled_tags, args, kwargs),
+                )
+
+            key = _make_key(f, args, kwargs)
+            local_cache = None
+            if local:
+                local_cache = _get_local_cache(f, local_size, local_timeout)
+                raw = local_cache.get(key)
+                if raw is not None:
+                    return _unpack(raw)[0]
+
+            _cache = get_cache()
+            _timeout = _cache.default_timeout if timeout is None else timeout
+            raw = get_conn().get(_cache.make_key(key))
+            token = None
+            if raw is not None:
+                value, delta, expires = _unpack(raw)
+                if _should_refresh(delta, expires, early_refresh):
+                    if single_flight:
+                        token = _acquire_lock(key, lock_timeout)
+                    if token is not None or not single_flight:
+                        raw = None
+            elif single_flight:
+                token = _acquire_lock(key, lock_timeout)
+                if token is None:
+                    raw = _wait_for_value(key, lock_wait)
+                    if raw is not None:
+                        value = _unpack(raw)[0]
+
+            if raw is None:
+                try:
+                    value, raw = _compute(
+                        f,
+                        args,
+                        kwargs,
+                        key,
+                        _timeout,
+                        _resolve_tags(signature, compiled_tags, args, kwargs),
+                    )
+                finally:
+                    if token is not None:
+                        _release_lock(key, token)
+            if local_cache is not None and value is not None:
+                local_cache.set(key, raw)
+            return value
 
         return wrapper
 
@@ -103,46 +588,433 @@ def memoize(_f=None, **cached_kwargs):
         return decorator(_f)
 
 
+def _make_key(f, args, kwargs):
+    """Get the cache key of a memoized call, relative to the cache prefix."""
+    return "%s:%s" % (f.__name__, _encode_key(args, kwargs))
+
+
+# Argument types which get a readable key instead of a hash
+_SIMPLE_KEY_TYPES = (str, bool, int, type(None))
+# Longer encoded arguments are hashed to keep keys short
+_MAX_KEY_LENGTH = 200
+
+
+def _encode_key(args, kwargs):
+    """
+    Encode the arguments of a memoized call.
+
+    The usual str/None/bool/int arguments are written out directly, keyword
+    arguments sorted by name. repr() keeps e.g. None and "None" distinct.
+    Anything else falls back to hashing the pickled arguments.
+    """
+    parts = []
+    for a in args:
+        if type(a) not in _SIMPLE_KEY_TYPES:
+            return _hash_key(args, kwargs)
+        parts.append(repr(a))
+    for k in sorted(kwargs):
+        v = kwargs[k]
+        if type(v) not in _SIMPLE_KEY_TYPES:
+            return _hash_key(args, kwargs)
+        parts.append("%s=%r" % (k, v))
+    encoded = ",".join(parts)
+    if len(encoded) > _MAX_KEY_LENGTH:
+        return _hash_key(args, kwargs)
+    return encoded
+
+
 def _hash_key(a, k):
     return hashlib.md5(pickle.dumps((a, k))).hexdigest()
 
 
+class PickleCodec(object):
+    """Serialize cached values with pickle."""
+
+    marker = b"p"
+
+    def dumps(self, value):
+        return self.marker + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, raw):
+        return pickle.loads(raw[1:])
+
+
+class MsgpackCodec(object):
+    """
+    Serialize cached values with msgpack (pip install ctf-web-api[msgpack]).
+
+    Naive (UTC) datetimes, as returned by pymongo, are stored as an extension
+    type holding microseconds since the epoch. Tuples come back as lists.
+    """
+
+    marker = b"m"
+    DATETIME_EXT = 1
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def dumps(self, value):
+        return self.marker + msgpack.packb(
+            value, default=self._default, use_bin_type=True
+        )
+
+    def loads(self, raw):
+        return msgpack.unpackb(
+            raw[1:], ext_hook=self._ext_hook, raw=False, strict_map_key=False
+        )
+
+    def _default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            if obj.tzinfo is not None:
+                obj = obj.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+            micros = (obj - self.EPOCH) // datetime.timedelta(microseconds=1)
+            return msgpack.ExtType(self.DATETIME_EXT, struct.pack(">q", micros))
+        raise TypeError("Cannot serialize {!r}".format(obj))
+
+    def _ext_hook(self, code, data):
+        if code == self.DATETIME_EXT:
+            micros = struct.unpack(">q", data)[0]
+            return self.EPOCH + datetime.timedelta(microseconds=micros)
+        return msgpack.ExtType(code, data)
+
+
+CODECS = {"pickle": PickleCodec()}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def get_codec():
+    """Get the value codec selected by the CACHE_CODEC app setting."""
+    if __redis.get("codec") is None:
+        __redis["codec"] = CODECS[current_app.config["CACHE_CODEC"]]
+    return __redis["codec"]
+
+
+def _dumps(value):
+    """
+    Serialize a value with the configured codec.
+
+    Values the codec cannot handle are pickled instead.
+    """
+    codec = get_codec()
+    try:
+        return codec.dumps(value)
+    except (TypeError, ValueError, OverflowError):
+        if isinstance(codec, PickleCodec):
+            raise
+        return CODECS["pickle"].dumps(value)
+
+
+def _loads(raw):
+    """Deserialize a value written by any codec, or by walrus itself."""
+    for codec in CODECS.values():
+        if raw[:1] == codec.marker:
+            return codec.loads(raw)
+    return pickle.loads(raw)
+
+
+def _pack(value, delta, expires):
+    """Serialize a value along with its compute time and expiry time."""
+    return ENVELOPE_MARKER + _dumps([value, delta, expires])
+
+
+def _unpack(raw):
+    """
+    Deserialize a stored value into (value, compute time, expiry time).
+
+    Values not written by _pack(), such as those cached by walrus before
+    compute times were recorded, count as never expiring.
+    """
+    if raw[:1] == ENVELOPE_MARKER:
+        return tuple(_loads(raw[1:]))
+    return _loads(raw), 0, None
+
+
 def get_scoreboard_key(team):
-    # For lack of better idea of delimiter, use '>' illegal team name char
-    return "{}>{}>{}".format(team["team_name"], team["affiliation"], team["tid"])
+    """Get a team's member key on the scoreboard ZSets, its tid."""
+    return team["tid"]
+
+
+def _scoreboard_team_key(tid):
+    return "scoreboard:team:{}".format(tid)
+
+
+def _scoreboard_version_key(scoreboard):
+    return "{}:board_version".format(scoreboard.key)
+
+
+def get_scoreboard_version(scoreboard):
+    """
+    Get a counter which changes whenever the teams or scores on a scoreboard do.
+
+    Args:
+        scoreboard: scoreboard cache ZSet
+    Returns:
+        the current version
+    """
+    return get_version(_scoreboard_version_key(scoreboard))
 
 
-def decode_scoreboard_item(item, with_weight=False, include_key=False):
+def set_scoreboard_teams(pipe, teams):
+    """
+    Store the display data of teams shown on scoreboards.
+
+    Args:
+        pipe: redis pipeline to queue the commands on
+        teams: team dicts with tid, team_name and affiliation
     """
-    :param item: tuple of ZSet (key, score)
+    for team in teams:
+        pipe.hset(
+            _scoreboard_team_key(team["tid"]),
+            mapping={"name": team["team_name"], "affiliation": team["affiliation"]},
+        )
+
+
+def get_scoreboard_teams(tids):
+    """
+    Get the display data of teams shown on scoreboards.
+
+    Read with one pipelined HMGET per team. Teams missing from redis are
+    loaded from the database and stored.
+
+    Args:
+        tids: list of team ids
+    Returns:
+        list of {name, affiliation} dicts, in the same order, None for
+        teams which do not exist
+    """
+    pipe = get_conn().pipeline(transaction=False)
+    for tid in tids:
+        pipe.hmget(_scoreboard_team_key(tid), "name", "affiliation")
+    teams = {
+        tid: {"name": name.decode("utf-8"), "affiliation": affiliation.decode("utf-8")}
+        for tid, (name, affiliation) in zip(tids, pipe.execute())
+        if name is not None
+    }
+
+    missing = [tid for tid in tids if tid not in teams]
+    if missing:
+        found = list(
+            api.db.get_conn().teams.find(
+                {"tid": {"$in": missing}},
+                {"_id": 0, "tid": 1, "team_name": 1, "affiliation": 1},
+            )
+        )
+        pipe = get_conn().pipeline(transaction=False)
+        set_scoreboard_teams(pipe, found)
+        pipe.execute()
+        for team in found:
+            teams[team["tid"]] = {
+                "name": team["team_name"],
+                "affiliation": team["affiliation"],
+            }
+    return [teams.get(tid) for tid in tids]
+
+
+def decode_scoreboard_items(items, with_weight=False):
+    """
+    :param items: list of ZSet (tid, score) tuples
     :param with_weight: keep decimal weighting of score, or return as int
-    :param include_key: whether to include to raw key
-    :return: dict of scoreboard item
-    """
-    key = item[0].decode("utf-8")
-    data = key.split(">")
-    score = item[1]
-    if not with_weight:
-        score = int(score)
-    output = {"name": data[0], "affiliation": data[1], "tid": data[2], "score": score}
-    if include_key:
-        output["key"] = key
+    :return: list of dicts of scoreboard items, without teams which no
+             longer exist
+    """
+    tids = [item[0].decode("utf-8") for item in items]
+    output = []
+    for tid, item, team in zip(tids, items, get_scoreboard_teams(tids)):
+        if team is None:
+            continue
+        score = item[1]
+        if not with_weight:
+            score = int(score)
+        output.append(
+            {
+                "name": team["name"],
+                "affiliation": team["affiliation"],
+                "tid": tid,
+                "score": score,
+            }
+        )
     return output
 
 
-def search_scoreboard_cache(scoreboard, pattern):
+def _search_grams(text):
+    """Get the lowercased substrings of a string indexed for search."""
+    text = text.lower()
+    return {
+        text[i : i + SEARCH_GRAM_LENGTH]
+        for i in range(len(text) - SEARCH_GRAM_LENGTH + 1)
+    }
+
+
+def _search_prefix(text):
+    """Get the search index term for the start of a word."""
+    return "prefix:{}".format(text)
+
+
+def _search_terms(team):
     """
-    :param scoreboard: scoreboard cache ZSet
-    :param pattern: text pattern to search team names and affiliations,
-                    not including wildcards
-    :return: sorted list of scoreboard entries
+    Get the terms a team is indexed under for search.
+
+    These are the trigrams of its lowercased name and affiliation, and the
+    starts of their words which are shorter than a trigram.
     """
-    # Trailing '*>' avoids search on last token, tid
-    results = [
-        decode_scoreboard_item(item, with_weight=True, include_key=True)
-        for item in list(scoreboard.search("*{}*>*".format(pattern)))
+    terms = set()
+    for text in (team["team_name"], team["affiliation"]):
+        terms |= _search_grams(text)
+        terms |= {
+            _search_prefix(word[:length])
+            for word in text.lower().split()
+            for length in range(1, SEARCH_GRAM_LENGTH)
+        }
+    return terms
+
+
+def _search_index_key(scoreboard, term=None):
+    """
+    Get the key of a scoreboard's search index set for a term.
+
+    Without a term, the key of the set of all the scoreboard's index keys.
+    """
+    if term is None:
+        return "{}:search".format(scoreboard.key)
+    return "{}:search:{}".format(scoreboard.key, term)
+
+
+def index_scoreboard_members(pipe, scoreboard, teams):
+    """
+    Add teams to the search index of a scoreboard.
+
+    Each trigram of a team's lowercased name and affiliation, and each
+    start of their words shorter than a trigram, maps to a set of the tids
+    containing it.
+
+    Args:
+        pipe: redis pipeline to queue the commands on
+        scoreboard: scoreboard cache ZSet
+        teams: team dicts with tid, team_name and affiliation
+    """
+    index_keys = set()
+    for team in teams:
+        for term in _search_terms(team):
+            index_key = _search_index_key(scoreboard, term)
+            pipe.sadd(index_key, team["tid"])
+            index_keys.add(index_key)
+    if index_keys:
+        pipe.sadd(_search_index_key(scoreboard), *index_keys)
+
+
+def replace_scoreboard(pipe, scoreboard, team_scores):
+    """
+    Replace the teams on a scoreboard, and its search index.
+
+    Args:
+        pipe: redis transaction to queue the commands on
+        scoreboard: scoreboard cache ZSet
+        team_scores: list of (team dict, score) tuples
+    """
+    index_keys = get_conn().smembers(_search_index_key(scoreboard))
+    pipe.delete(scoreboard.key, _search_index_key(scoreboard), *index_keys)
+    queue_version_bump(pipe, _scoreboard_version_key(scoreboard))
+    if team_scores:
+        teams = [team for team, _ in team_scores]
+        pipe.zadd(
+            scoreboard.key,
+            {get_scoreboard_key(team): score for team, score in team_scores},
+        )
+        set_scoreboard_teams(pipe, teams)
+        index_scoreboard_members(pipe, scoreboard, teams)
+
+
+def reindex_scoreboard_team(scoreboard_keys, old_team, team):
+    """
+    Update a team's display data and search index after it was renamed.
+
+    Args:
+        scoreboard_keys: list of get_scoreboard_cache kwargs the team may be on
+        old_team: the team dict before the change
+        team: the team dict after the change
+    """
+    conn = get_conn()
+    scoreboards = [get_scoreboard_cache(**key) for key in scoreboard_keys]
+    pipe = conn.pipeline(transaction=False)
+    for scoreboard in scoreboards:
+        pipe.zscore(scoreboard.key, get_scoreboard_key(team))
+    scores = pipe.execute()
+
+    old_terms = _search_terms(old_team)
+    pipe = conn.pipeline(transaction=False)
+    set_scoreboard_teams(pipe, [team])
+    for scoreboard, score in zip(scoreboards, scores):
+        if score is None:
+            continue
+        for term in old_terms:
+            pipe.srem(_search_index_key(scoreboard, term), team["tid"])
+        index_scoreboard_members(pipe, scoreboard, [team])
+        queue_version_bump(pipe, _scoreboard_version_key(scoreboard))
+    pipe.execute()
+
+
+def search_scoreboard_cache(scoreboard, pattern, start, end):
+    """
+    Search the teams on a scoreboard by name and affiliation.
+
+    Patterns shorter than SEARCH_GRAM_LENGTH match the start of a word, and
+    are ranked and paged within redis. An empty pattern matches every team.
+
+    Args:
+        scoreboard: scoreboard cache ZSet
+        pattern: text pattern to search team names and affiliations for,
+                 not including wildcards, case insensitive
+        start: index of the first matching entry to return
+        end: index after the last matching entry to return
+    Returns:
+        (list of the matching scoreboard entries from start to end, sorted
+         by score, total number of matching entries)
+    """
+    conn = get_conn()
+    needle = pattern.lower()
+    if not needle.strip():
+        pipe = conn.pipeline()
+        pipe.zrevrange(scoreboard.key, start, end - 1, withscores=True)
+        pipe.zcard(scoreboard.key)
+        items, total = pipe.execute()
+        return decode_scoreboard_items(items, with_weight=True), total
+
+    if len(needle) < SEARCH_GRAM_LENGTH:
+        # Rank the teams with a word starting with the pattern by their scores
+        prefix = needle.strip()
+        prefix_key = _search_index_key(scoreboard, _search_prefix(prefix))
+        result_key = "{}:search_result:{}".format(scoreboard.key, prefix)
+        pipe = conn.pipeline()
+        pipe.zinterstore(result_key, {scoreboard.key: 1, prefix_key: 0})
+        pipe.zrevrange(result_key, start, end - 1, withscores=True)
+        pipe.delete(result_key)
+        total, items, _ = pipe.execute()
+        return decode_scoreboard_items(items, with_weight=True), total
+
+    grams = _search_grams(needle)
+    candidates = conn.sinter([_search_index_key(scoreboard, gram) for gram in grams])
+    tids = [tid.decode("utf-8") for tid in candidates]
+
+    # Trigrams only narrow down the candidates, so check for the pattern
+    matches = [
+        tid
+        for tid, team in zip(tids, get_scoreboard_teams(tids))
+        if team is not None
+        and (needle in team["name"].lower() or needle in team["affiliation"].lower())
     ]
-    return sorted(results, key=lambda item: item["score"], reverse=True)
+
+    pipe = conn.pipeline(transaction=False)
+    for tid in matches:
+        pipe.zscore(scoreboard.key, tid)
+    items = sorted(
+        [
+            (tid.encode("utf-8"), score)
+            for tid, score in zip(matches, pipe.execute())
+            if score is not None
+        ],
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return decode_scoreboard_items(items[start:end], with_weight=True), len(items)
 
 
 def invalidate(f, *args, **kwargs):
@@ -152,7 +1024,264 @@ def invalidate(f, *args, **kwargs):
     """
     if f == api.stats.get_score:
         key = args[0]
-        get_score_cache().remove(key)
+        pipe = get_conn().pipeline()
+        pipe.zrem(get_score_cache().key, key)
+        pipe.delete(_score_solves_key(key))
+        pipe.execute()
     else:
-        key = "%s:%s" % (f.__name__, _hash_key(args, kwargs))
+        key = _make_key(f, args, kwargs)
         get_cache().delete(key)
+        _delete_local(key)
+        _publish_invalidation(key)
+
+
+def _score_solves_key(key):
+    return "scores:solved:{}".format(key)
+
+
+def cache_score(key, score, pids):
+    """
+    Cache a computed get_score result.
+
+    Solves recorded by increment_scores() while the score was computed make
+    it stale, in which case it is not cached and the next lookup recomputes.
+
+    Args:
+        key: get_score cache key (tid/uid)
+        score: the time weighted score
+        pids: the solved problems the score counts
+    Returns:
+        whether the score was cached
+    """
+    return bool(
+        get_script("cache_score", CACHE_SCORE_SCRIPT)(
+            keys=[get_score_cache().key, _score_solves_key(key)],
+            args=[key, repr(score)] + list(pids),
+        )
+    )
+
+
+def increment_scores(keys, pid, points, time_weight):
+    """
+    Update cached get_score results in place for a new solve.
+
+    Each cached score records the pids it counts, so a solve is added at
+    most once, even if the score was computed after it was submitted.
+
+    Args:
+        keys: get_score cache keys (tids/uids) credited with the solve
+        pid: the solved problem
+        points: the solved problem's score
+        time_weight: time weight of the solve, which is now the latest
+    Returns:
+        the number of cached scores which were updated
+    """
+    return get_script("increment_scores", INCREMENT_SCORES_SCRIPT)(
+        keys=[get_score_cache().key] + [_score_solves_key(key) for key in keys],
+        args=[points, repr(time_weight), pid] + list(keys),
+    )
+
+
+def _progression_solves_key(key):
+    return "{}:solved".format(key)
+
+
+def cache_progression(key, entries, pids, timeout):
+    """
+    Cache a computed score progression list.
+
+    Solves recorded by append_progressions() while the list was computed
+    make it stale, in which case it is not cached and the next lookup
+    recomputes.
+
+    Args:
+        key: score progression list key
+        entries: the list's "time:score" entries
+        pids: the solved problems the list counts
+        timeout: seconds after which the list expires
+    Returns:
+        whether the list was cached
+    """
+    return bool(
+        get_script("cache_progression", CACHE_PROGRESSION_SCRIPT)(
+            keys=[key, _progression_solves_key(key)],
+            args=[timeout, len(pids)] + list(pids) + [PROGRESSION_START] + entries,
+        )
+    )
+
+
+def append_progressions(keys, pid, points, time, timeout):
+    """
+    Append a solve to the score progression lists which exist.
+
+    Each list records the pids it counts, so a solve is appended at most
+    once, even if the list was built after it was submitted.
+
+    Args:
+        keys: score progression list keys credited with the solve
+        pid: the solved problem
+        points: the solved problem's score
+        time: unix time of the solve
+        timeout: seconds to remember the solve for lists not built yet
+    Returns:
+        the number of lists which were appended to
+    """
+    script_keys = []
+    for key in keys:
+        script_keys += [key, _progression_solves_key(key)]
+    return get_script("append_progressions", APPEND_PROGRESSIONS_SCRIPT)(
+        keys=script_keys, args=[time, points, pid, timeout]
+    )
+
+
+def drop_progressions(keys):
+    """
+    Drop score progression lists, so they are rebuilt on their next lookup.
+
+    Args:
+        keys: score progression list keys
+    """
+    get_conn().delete(*keys, *[_progression_solves_key(key) for key in keys])
+
+
+def increment_if_exists(key, field):
+    """
+    Increment a counter in a redis hash, unless the hash is not built yet.
+
+    Args:
+        key: the hash
+        field: the counter
+    Returns:
+        the new count, or None if the hash does not exist
+    """
+    return get_script("increment_if_exists", INCREMENT_IF_EXISTS_SCRIPT)(
+        keys=[key], args=[field]
+    )
+
+
+def update_scoreboards(scoreboard_keys, team, score):
+    """
+    Set a team's score on several scoreboard ZSets in one round trip.
+
+    Args:
+        scoreboard_keys: list of get_scoreboard_cache kwargs
+        team: the team dict
+        score: the team's time weighted score
+    """
+    pipe = get_conn().pipeline(transaction=False)
+    set_scoreboard_teams(pipe, [team])
+    for scoreboard_key in scoreboard_keys:
+        scoreboard = get_scoreboard_cache(**scoreboard_key)
+        pipe.zadd(scoreboard.key, {get_scoreboard_key(team): score})
+        index_scoreboard_members(pipe, scoreboard, [team])
+        queue_version_bump(pipe, _scoreboard_version_key(scoreboard))
+    pipe.execute()
+
+
+def invalidate_tags(*tags):
+    """
+    Drop every memoized value recorded under any of the given tags.
+
+    Done in a single round trip to redis, independent of how the
+    memoized functions were called.
+
+    Args:
+        tags: entity tags, e.g. "team:{tid}".format(tid=tid)
+    """
+    _cache = get_cache()
+    deleted = get_script("invalidate_tags", INVALIDATE_TAGS_SCRIPT)(
+        keys=[_tag_key(tag) for tag in tags]
+    )
+    prefix_len = len(_cache.make_key(""))
+    keys = [key.decode("utf-8")[prefix_len:] for key in deleted]
+    for key in keys:
+        _delete_local(key)
+    _publish_invalidation(*keys)
+
+
+def get_version(key):
+    """
+    Get a counter which is bumped whenever some shared data changes.
+
+    Args:
+        key: redis key of the counter
+    Returns:
+        the current version
+    """
+    conn = get_conn()
+    version = conn.get(key)
+    if version is None:
+        # Start from the time, so versions are not reused after a flush
+        conn.set(key, int(time.time() * 1000), nx=True)
+        version = conn.get(key)
+    return int(version)
+
+
+def bump_version(key):
+    """
+    Bump a version counter, so that copies of its data are reloaded.
+
+    Args:
+        key: redis key of the counter
+    """
+    pipe = get_conn().pipeline()
+    queue_version_bump(pipe, key)
+    pipe.execute()
+
+
+def queue_version_bump(pipe, key):
+    """
+    Queue a version bump on a pipeline.
+
+    A missing counter is seeded from the time first, as in get_version(),
+    so that it does not restart from 1 after a flush and repeat old values.
+
+    Args:
+        pipe: redis pipeline
+        key: redis key of the counter
+    """
+    pipe.set(key, int(time.time() * 1000), nx=True)
+    pipe.incr(key)
+
+
+def get_request_cached(key, f):
+    """
+    Get a value computed at most once per request.
+
+    Values are kept on flask.g, so they never outlive the request. Outside
+    of a request f is simply called. Callers get their own copy, which they
+    may modify.
+
+    Args:
+        key: tuple naming the value, starting with its kind, e.g. ("user", uid)
+        f: function computing the value. None results are not kept.
+    Returns:
+        the value
+    """
+    if not has_request_context():
+        return f()
+    values = g.setdefault("request_cache", {})
+    if values.get(key) is None:
+        values[key] = f()
+    return copy.deepcopy(values[key])
+
+
+def drop_request_cached(kind):
+    """
+    Drop every value of a kind cached for the current request.
+
+    Call this after writing to what the values were read from.
+
+    Args:
+        kind: the kind of value, e.g. "user"
+    """
+    if has_request_context() and "request_cache" in g:
+        for key in [key for key in g.request_cache if key[0] == kind]:
+            del g.request_cache[key]
+
+
+def get_script(name, source):
+    """Get a registered redis Lua script, reusing one if it exists."""
+    if __redis["scripts"].get(name) is None:
+        __redis["scripts"][name] = get_conn().register_script(source)
+    return __redis["scripts"][name]
@@ -1,12 +1,20 @@
 """Stores and retrieves runtime settings from the database."""
 
 import datetime
+import time
 from copy import deepcopy
 from functools import wraps
 
+from flask import current_app, g, has_app_context, has_request_context
+
 import api
 from api import PicoException
 
+# Redis key of the settings version, bumped whenever the settings change
+SETTINGS_VERSION_KEY = "settings_version"
+
+__settings = {"current": None}
+
 """
 Default Settings
 
@@ -217,16 +225,95 @@ The {competition_name} Team""",  # noqa (79char)
 }
 
 
+class _ReadOnlyDict(dict):
+    """A dict which cannot be modified, shared by all callers of get_settings."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Settings are read-only, use change_settings() instead")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (_ReadOnlyDict, (dict(self),))
+
+
+def _freeze(value):
+    """Recursively make read-only copies of dicts and lists."""
+    if isinstance(value, dict):
+        return _ReadOnlyDict({k: _freeze(v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """Recursively make modifiable copies of _freeze()'s dicts and tuples."""
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    elif isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
 def get_settings():
-    """Retrieve settings from the database."""
+    """
+    Retrieve the current settings.
+
+    Each worker keeps a read-only snapshot of the settings. It is reloaded
+    once it is older than SETTINGS_CACHE_TIMEOUT seconds, or as soon as the
+    settings version in redis is bumped by a write, which is checked at most
+    once per request.
+
+    Returns:
+        read-only dict of the settings. Use deepcopy() for a modifiable copy.
+
+    """
+    if has_request_context() and "settings" in g:
+        return g.settings
+    timeout = 0
+    if has_app_context():
+        timeout = current_app.config["SETTINGS_CACHE_TIMEOUT"]
+    version = api.cache.get_version(SETTINGS_VERSION_KEY)
+    snapshot = __settings["current"]
+    if (
+        snapshot is None
+        or snapshot["version"] != version
+        or time.time() - snapshot["loaded"] >= timeout
+    ):
+        snapshot = {
+            "version": version,
+            "loaded": time.time(),
+            "settings": _freeze(_load_settings()),
+        }
+        __settings["current"] = snapshot
+    if has_request_context():
+        g.settings = snapshot["settings"]
+    return snapshot["settings"]
+
+
+def _load_settings():
+    """Read the settings from the database, inserting the defaults if missing."""
     db = api.db.get_conn()
     settings = db.settings.find_one({}, {"_id": 0})
     if settings is None:
         db.settings.insert(default_settings.copy())
-        return default_settings
+        return deepcopy(default_settings)
     return settings
 
 
+def _bump_settings_version():
+    api.cache.bump_version(SETTINGS_VERSION_KEY)
+    if has_request_context():
+        g.pop("settings", None)
+
+
 def merge_new_settings():
     """Add any new default_settings into the database."""
 
@@ -240,10 +327,11 @@ def merge_new_settings():
                 out[k] = merge(v, out[k])
         return out
 
-    db_settings = get_settings()
+    db_settings = _load_settings()
     merged = merge(default_settings, db_settings)
     db = api.db.get_conn()
     db.settings.find_one_and_update({}, {"$set": merged})
+    _bump_settings_version()
 
 
 def change_settings(changes):
@@ -255,7 +343,7 @@ def change_settings(changes):
                        or the updated value is of a different type
 
     """
-    settings = get_settings()
+    settings = _load_settings()
 
     # @TODO validate incoming settings at the request level
     def check_keys(real, changed):
@@ -282,6 +370,7 @@ def change_settings(changes):
     check_keys(settings, changes)
     db = api.db.get_conn()
     db.settings.find_one_and_update({}, {"$set": changes})
+    _bump_settings_version()
 
 
 def check_competition_active():
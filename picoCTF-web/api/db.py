@@ -92,6 +92,12 @@ def get_conn():
             "sid", unique=True, name="unique shell sid"
         )
 
+        __connection.solves.create_index(
+            [("uid", 1), ("pid", 1)], unique=True, name="unique uid and pid"
+        )
+        __connection.solves.create_index("tid")
+        __connection.solves.create_index([("pid", 1), ("tid", 1)])
+
         __connection.submissions.create_index([("pid", 1), ("uid", 1), ("correct", 1)])
         __connection.submissions.create_index([("pid", 1), ("tid", 1), ("correct", 1)])
         __connection.submissions.create_index([("uid", 1), ("correct", 1)])
@@ -17,6 +17,9 @@ REDIS_ADDR = "127.0.0.1"
 REDIS_PORT = 6379
 REDIS_PW = None
 
+CACHE_CODEC = "pickle"              # value serialization: pickle or msgpack
+SETTINGS_CACHE_TIMEOUT = 10         # seconds a worker reuses the settings
+
 RATE_LIMIT_BYPASS_KEY = "INSECURE_DEFAULT_CHANGE_ME"
 SECRET_KEY = "INSECURE_DEFAULT_CHANGE_ME"
 
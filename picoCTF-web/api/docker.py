@@ -224,6 +224,24 @@ def list_containers_db(tid):
     db = api.db.get_conn()
     return db.containers.find({"tid": tid})
 
+
+def get_team_containers(tid):
+    """
+    Map each problem to the first tracked container of a team.
+
+    Args:
+        tid: The team id to lookup containers for
+    Returns:
+        dict of problem ids to container documents
+    """
+
+    db = api.db.get_conn()
+    containers = {}
+    for container in db.containers.find({"tid": tid}, {"_id": 0}):
+        containers.setdefault(container["pid"], container)
+    return containers
+
+
 def submission_to_cid(tid, pid):
     """
     Check containers collection for a given team id and problem id pair.
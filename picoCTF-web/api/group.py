@@ -172,9 +172,11 @@ def join_group(gid, tid, teacher=False):
         uids = api.team.get_team_uids(tid=tid)
         for uid in uids:
             db.users.update({"uid": uid}, {"$set": {"teacher": True}})
+        cache.drop_request_cached("user")
 
     db.groups.update({"gid": gid}, {"$addToSet": {role_group: tid}})
     cache.invalidate(api.team.get_groups, tid)
+    _bump_membership_version(gid)
 
 
 @log_action
@@ -190,6 +192,7 @@ def leave_group(gid, tid):
     db.groups.update({"gid": gid}, {"$pull": {"teachers": tid}})
     db.groups.update({"gid": gid}, {"$pull": {"members": tid}})
     cache.invalidate(api.team.get_groups, tid)
+    _bump_membership_version(gid)
 
 
 @log_action
@@ -205,6 +208,7 @@ def elevate_team(gid, tid):
     db.groups.update({"gid": gid}, {"$pull": {"members": tid}})
     db.groups.update({"gid": gid}, {"$addToSet": {"teachers": tid}})
     cache.invalidate(api.team.get_groups, tid)
+    _bump_membership_version(gid)
 
 
 @log_action
@@ -217,6 +221,27 @@ def delete_group(gid):
     """
     db = api.db.get_conn()
     db.groups.remove({"gid": gid})
+    _bump_membership_version(gid)
+
+
+def _membership_version_key(gid):
+    return "group_membership_version:{}".format(gid)
+
+
+def get_membership_version(gid):
+    """
+    Get a counter which changes whenever the membership of a group does.
+
+    Args:
+        gid: the group id
+    Returns:
+        the current version, 0 if the membership never changed
+    """
+    return int(cache.get_conn().get(_membership_version_key(gid)) or 0)
+
+
+def _bump_membership_version(gid):
+    cache.get_conn().incr(_membership_version_key(gid))
 
 
 def get_all_groups():
@@ -225,6 +250,29 @@ def get_all_groups():
     return list(db.groups.find({}, {"_id": 0}))
 
 
+def get_hidden_tids():
+    """
+    Get the teams which are exclusively members of hidden groups.
+
+    These teams are left off of the scoreboards. Built in a single pass
+    over the groups, so the check per team is a set lookup.
+
+    Returns:
+        set of tids
+    """
+    db = api.db.get_conn()
+    hidden = set()
+    visible = set()
+    for group in db.groups.find(
+        {}, {"_id": 0, "owner": 1, "teachers": 1, "members": 1, "settings.hidden": 1}
+    ):
+        tids = hidden if group["settings"]["hidden"] else visible
+        tids.add(group["owner"])
+        tids.update(group["teachers"])
+        tids.update(group["members"])
+    return hidden - visible
+
+
 def batch_register(students, teacher, gid):
     """
     Batch registers multiple students and assigns them to a group.
@@ -1,15 +1,21 @@
 """Module for interacting with the problems."""
 
+import copy
 from random import randint
 
 import pymongo
-from flask import current_app
+from flask import current_app, g, has_request_context
 from voluptuous import ALLOW_EXTRA, Range, Required, Schema
 
 import api
 from api import check, PicoException, validate
 from api.cache import memoize
 
+# Redis key of the problem catalog version, bumped whenever problems change
+CATALOG_VERSION_KEY = "problem_catalog_version"
+
+__catalog = {"current": None}
+
 problem_schema = Schema(
     {
         Required("name"): check(
@@ -64,6 +70,92 @@ instance_schema = Schema(
 )
 
 
+def get_catalog_version():
+    """
+    Get a counter which changes whenever any problem does.
+
+    Returns:
+        the current version
+    """
+    return api.cache.get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Make every worker reload its problem catalog.
+
+    Call this after writing to the problems collection.
+    """
+    api.cache.bump_version(CATALOG_VERSION_KEY)
+    if has_request_context():
+        g.pop("problem_catalog", None)
+
+
+def _load_catalog(version):
+    """Read every problem and index it by pid, iid, category and flag."""
+    db = api.db.get_conn()
+    problems = {}
+    instances = {}
+    categories = {}
+    flags = {}
+    for problem in db.problems.find({}, {"_id": 0}).sort(
+        [("score", pymongo.ASCENDING), ("name", pymongo.ASCENDING)]
+    ):
+        problems[problem["pid"]] = problem
+        flags[problem["pid"]] = {}
+        for instance in problem.get("instances", []):
+            instances[instance["iid"]] = (problem["pid"], instance)
+            flags[problem["pid"]].setdefault(instance["flag"], []).append(
+                instance["iid"]
+            )
+        categories.setdefault(problem["category"], []).append(problem["pid"])
+    return {
+        "version": version,
+        "problems": problems,
+        "instances": instances,
+        "categories": categories,
+        "flags": {
+            pid: (problem_flags, sorted({len(flag) for flag in problem_flags}))
+            for pid, problem_flags in flags.items()
+        },
+    }
+
+
+def _get_catalog():
+    """
+    Get this worker's catalog of all problems.
+
+    The catalog is reloaded from the database when the version in redis
+    changes, which is checked at most once per request.
+    """
+    if has_request_context() and "problem_catalog" in g:
+        return g.problem_catalog
+    version = get_catalog_version()
+    catalog = __catalog["current"]
+    if catalog is None or catalog["version"] != version:
+        catalog = _load_catalog(version)
+        __catalog["current"] = catalog
+    if has_request_context():
+        g.problem_catalog = catalog
+    return catalog
+
+
+def _project(problem, projection=None):
+    """Copy the fields of a catalog problem selected by a projection."""
+    if not projection:
+        return copy.deepcopy(problem)
+    if any(projection.values()):
+        fields = [field for field, include in projection.items() if include]
+        return {
+            field: copy.deepcopy(problem[field]) for field in fields if field in problem
+        }
+    return {
+        field: copy.deepcopy(value)
+        for field, value in problem.items()
+        if field not in projection
+    }
+
+
 def get_all_categories():
     """
     Get the set of distinct problem categories.
@@ -72,10 +164,13 @@ def get_all_categories():
         The set of distinct problem categories.
 
     """
-    db = api.db.get_conn()
+    catalog = _get_catalog()
     # Do not return categories that only appear on disabled problems
-    match = {"disabled": False}
-    return db.problems.find(match).distinct("category")
+    return [
+        category
+        for category, pids in catalog["categories"].items()
+        if any(not catalog["problems"][pid]["disabled"] for pid in pids)
+    ]
 
 
 def upsert_problem(problem, sid):
@@ -157,25 +252,21 @@ def upsert_problem(problem, sid):
     return problem["pid"]
 
 
-def assign_instance_to_team(pid, tid=None, reassign=False):
+def _choose_instance(problem, team, settings):
     """
-    Assign an instance of problem pid to team tid.
+    Pick a random instance of a problem for a team.
 
     Args:
-        pid: the problem id
-        tid: the team id
-        reassign: whether or not we should assign over an old assignment
+        problem: the problem dict, including its instances
+        team: the team dict
+        settings: the current settings
 
     Returns:
-        The iid that was assigned
+        (instance number, iid)
 
     """
-    team = api.team.get_team(tid=tid)
-    problem = get_problem(pid)
-
     available_instances = problem["instances"]
 
-    settings = api.config.get_settings()
     if settings["shell_servers"]["enable_sharding"]:
         available_instances = list(
             filter(
@@ -184,11 +275,6 @@ def assign_instance_to_team(pid, tid=None, reassign=False):
             )
         )
 
-    if pid in team["instances"] and not reassign:
-        raise PicoException(
-            "Team with tid {} already has an instance of pid {}.".format(tid, pid)
-        )
-
     if len(available_instances) == 0:
         if settings["shell_servers"]["enable_sharding"]:
             raise PicoException(
@@ -196,19 +282,85 @@ def assign_instance_to_team(pid, tid=None, reassign=False):
                 + "Please contact an admin."
             )
         else:
-            raise PicoException("Problem {} has no instances to assign.".format(pid))
+            raise PicoException(
+                "Problem {} has no instances to assign.".format(problem["pid"])
+            )
 
     instance_number = randint(0, len(available_instances) - 1)
-    iid = available_instances[instance_number]["iid"]
+    return instance_number, available_instances[instance_number]["iid"]
+
+
+def assign_instance_to_team(pid, tid=None, reassign=False):
+    """
+    Assign an instance of problem pid to team tid.
+
+    Args:
+        pid: the problem id
+        tid: the team id
+        reassign: whether or not we should assign over an old assignment
+
+    Returns:
+        The iid that was assigned
+
+    """
+    team = api.team.get_team(tid=tid)
+    problem = _get_catalog()["problems"].get(pid)
+
+    if pid in team["instances"] and not reassign:
+        raise PicoException(
+            "Team with tid {} already has an instance of pid {}.".format(tid, pid)
+        )
 
-    team["instances"][pid] = iid
+    instance_number, iid = _choose_instance(problem, team, api.config.get_settings())
 
     db = api.db.get_conn()
-    db.teams.update({"tid": tid}, {"$set": team})
+    db.teams.update({"tid": tid}, {"$set": {"instances.{}".format(pid): iid}})
+    api.cache.drop_request_cached("team")
 
     return instance_number
 
 
+def assign_instances_to_team(pids, tid):
+    """
+    Assign instances of several problems to a team at once.
+
+    Instances are picked in memory and written in one round trip. Each
+    assignment is only applied if the team still has no instance of that
+    problem, so concurrent calls never replace each other's choices.
+
+    Args:
+        pids: the problem ids
+        tid: the team id
+
+    Returns:
+        The number of instances that were assigned
+
+    """
+    team = api.team.get_team(tid=tid)
+    settings = api.config.get_settings()
+
+    catalog = _get_catalog()
+    updates = []
+    for pid in pids:
+        problem = catalog["problems"].get(pid)
+        if problem is None or pid in team["instances"]:
+            continue
+        _, iid = _choose_instance(problem, team, settings)
+        field = "instances.{}".format(problem["pid"])
+        updates.append(
+            pymongo.UpdateOne(
+                {"tid": tid, field: {"$exists": False}}, {"$set": {field: iid}}
+            )
+        )
+
+    if not updates:
+        return 0
+    db = api.db.get_conn()
+    assigned = db.teams.bulk_write(updates, ordered=False).modified_count
+    api.cache.drop_request_cached("team")
+    return assigned
+
+
 def get_instance_data(pid, tid):
     """
     Return the instance dictionary for the specified pid, tid pair.
@@ -222,93 +374,209 @@ def get_instance_data(pid, tid):
 
     """
     instance_map = api.team.get_team(tid=tid)["instances"]
-    problem = get_problem(pid)
 
     if pid not in instance_map:
         iid = assign_instance_to_team(pid, tid)
     else:
         iid = instance_map[pid]
 
-    for instance in problem["instances"]:
-        if instance["iid"] == iid:
-            return instance
+    instance_pid, instance = get_instance(iid)
+    if instance_pid == pid:
+        return instance
 
     # Cannot find assigned instance. Reassign instance and recurse.
     assign_instance_to_team(pid, tid, reassign=True)
     return get_instance_data(pid, tid)
 
 
-def filter_problem_instances(problem, tid):
+def filter_problem_instances(problem, tid, instance_map=None):
     """
     Replace problem fields with those in a team's assigned instance.
 
-    Also removes the original 'instances' field.
+    Also removes the original 'instances' field, if present. Without it, the
+    assigned instance is looked up in the problem catalog.
 
     Args:
         problem: the problem dict
         tid: the team id
+        instance_map (optional): the team's map of pids to assigned iids,
+            used to pick the instance without looking the team up again
 
     Returns:
         The filtered problem dict
 
     """
-    instance = get_instance_data(problem["pid"], tid)
-    problem.pop("instances")
+    instances = problem.pop("instances", None)
+    iid = (instance_map or {}).get(problem["pid"])
+    if instances is not None:
+        instance = next((i for i in instances if i["iid"] == iid), None)
+    else:
+        instance_pid, instance = get_instance(iid)
+        if instance_pid != problem["pid"]:
+            instance = None
+    if instance is None:
+        instance = get_instance_data(problem["pid"], tid)
     problem.update(instance)
     return problem
 
 
+def annotate_problems(problems, tid, reviews=False):
+    """
+    Add a team's view of each problem to a list of problems.
+
+    Sets the solves, unlocked, solved and container fields of each problem
+    (and reviews, if requested) using a fixed number of lookups for the whole
+    list rather than several per problem.
+
+    Args:
+        problems: list of problem dicts, modified in place
+        tid: the team id
+        reviews (optional): include like/dislike counts for each problem
+
+    Returns:
+        The annotated list of problems
+
+    """
+    unlocked = set(get_unlocked_pids(tid))
+    solved = set(get_solved_pids(tid=tid))
+    solves = api.stats.get_all_problem_solves()
+    containers = api.docker.get_team_containers(tid)
+    if reviews:
+        feedback = api.problem_feedback.get_problem_feedback_counts()
+
+    for problem in problems:
+        pid = problem["pid"]
+        problem["solves"] = solves.get(pid, 0)
+        problem["unlocked"] = pid in unlocked
+        problem["solved"] = pid in solved
+        if reviews:
+            problem["reviews"] = feedback.get(pid, {"likes": 0, "dislikes": 0})
+        if pid in containers:
+            problem["container"] = containers[pid]
+    return problems
+
+
 def get_problem(pid, projection=None):
     """
     Get a single problem.
 
+    Read from the problem catalog rather than the database.
+
     Args:
         pid: The problem id
         projection: optional filter to project
 
     Returns:
-        The problem dictionary from the database or None if problem not found
+        The problem dictionary or None if problem not found
 
     """
-    db = api.db.get_conn()
-    problem_filter = {"_id": 0}
-    if projection is not None:
-        problem_filter.update(projection)
-    return db.problems.find_one({"pid": pid}, problem_filter)
+    problem = _get_catalog()["problems"].get(pid)
+    if problem is None:
+        return None
+    return _project(problem, projection)
 
 
-def get_all_problems(category=None, show_disabled=False):
+def get_instance(iid):
     """
-    Get all of the problems, with optional filtering.
+    Get a single problem instance.
 
     Args:
-        category (optional): Return only problems from this category
-        show_disabled (optional): Include disabled problems
+        iid: The instance id
+
+    Returns:
+        (pid, instance dict), or (None, None) if the instance is not found
+
+    """
+    pid, instance = _get_catalog()["instances"].get(iid, (None, None))
+    return pid, copy.deepcopy(instance)
+
+
+def find_flag_instances(pid, key):
+    """
+    Find the instances of a problem whose flag appears in a key.
+
+    Uses the catalog's index of flags, so only the substrings of the key
+    with the length of some flag are looked up, however many instances
+    the problem has.
+
+    Args:
+        pid: The problem id
+        key: The submitted key
 
     Returns:
-        List of problem dicts
+        List of iids whose flag is a substring of the key
 
     """
+    flags, lengths = _get_catalog()["flags"].get(pid, ({}, []))
+    iids = []
+    for length in lengths:
+        for start in range(len(key) - length + 1):
+            iids.extend(flags.get(key[start : start + length], []))
+    return list(dict.fromkeys(iids))
+
+
+def get_instance_owners(pid_iids):
+    """
+    Get the teams assigned to some problem instances, in a single query.
+
+    Args:
+        pid_iids: dict of problem ids to the instance ids to look up
+
+    Returns:
+        dict of each iid to a list of {tid, team_name} dicts
+
+    """
+    owners = {iid: [] for iids in pid_iids.values() for iid in iids}
+    queries = [
+        {"instances.{}".format(pid): {"$in": list(iids)}}
+        for pid, iids in pid_iids.items()
+        if iids
+    ]
+    if not queries:
+        return owners
+
+    projection = {"_id": 0, "tid": 1, "team_name": 1}
+    projection.update({"instances.{}".format(pid): 1 for pid in pid_iids})
     db = api.db.get_conn()
+    for team in db.teams.find({"$or": queries}, projection):
+        for iid in team.get("instances", {}).values():
+            if iid in owners:
+                owners[iid].append({"tid": team["tid"], "team_name": team["team_name"]})
+    return owners
 
-    match = {}
-    if category is not None:
-        match.update({"category": category})
 
-    if not show_disabled:
-        match.update({"disabled": False})
+def get_all_problems(category=None, show_disabled=False, include_instances=False):
+    """
+    Get all of the problems, with optional filtering.
+
+    Args:
+        category (optional): Return only problems from this category
+        show_disabled (optional): Include disabled problems
+        include_instances (optional): Include the instances of each problem
 
-    # Return all except objectID
-    projection = {"_id": 0}
+    Returns:
+        List of problem dicts, ordered by score and name
 
-    return list(
-        db.problems.find(match, projection).sort(
-            [("score", pymongo.ASCENDING), ("name", pymongo.ASCENDING)]
-        )
-    )
+    """
+    catalog = _get_catalog()
+    if category is not None:
+        pids = catalog["categories"].get(category, [])
+    else:
+        pids = catalog["problems"]
+    projection = None if include_instances else {"instances": 0}
+    return [
+        _project(catalog["problems"][pid], projection)
+        for pid in pids
+        if show_disabled or not catalog["problems"][pid]["disabled"]
+    ]
 
 
-@memoize(timeout=3 * 24 * 60 * 60)
+@memoize(
+    timeout=3 * 24 * 60 * 60,
+    local=True,
+    tags=["team:{tid}", "user:{uid}"],
+    single_flight=True,
+)
 def get_solved_problems(tid=None, uid=None, category=None, show_disabled=False):
     """
     Get the solved problems for a given team or user.
@@ -326,45 +594,28 @@ def get_solved_problems(tid=None, uid=None, category=None, show_disabled=False):
     else:
         team = api.team.get_team(tid=tid)
 
+    # Solves credited to the team, or to the user, and to every member
     members = api.team.get_team_uids(tid=team["tid"])
-
-    submissions = api.submissions.get_submissions(
-        tid=tid, uid=uid, category=category, correctness=True
-    )
-
-    for uid in members:
-        submissions += api.submissions.get_submissions(
-            uid=uid, category=category, correctness=True
-        )
+    if uid is not None:
+        solves = api.submissions.get_solves(uids=members + [uid], category=category)
+    else:
+        solves = api.submissions.get_solves(tid=tid, uids=members, category=category)
 
     pid_times = {}
-    result = []
-
-    # Team submissions will take precedence because they appear first
-    # in the submissions list.
-    for submission in submissions:
-        pid = submission["pid"]
-        if pid not in pid_times:
-            problem = get_problem(
-                pid,
-                {
-                    "pid": 1,
-                    "unique_name": 1,
-                    "score": 1,
-                    "name": 1,
-                    "disabled": 1,
-                    "category": 1,
-                },
-            )
-            if problem is not None:
-                problem.update({"solved": True, "unlocked": True})
-                if not problem["disabled"] or show_disabled:
-                    result.append(problem)
-                pid_times[pid] = submission["timestamp"]
-        else:
-            pid_times[pid] = min(submission["timestamp"], pid_times.get(pid))
+    for solve in solves:
+        pid = solve["pid"]
+        if pid not in pid_times or solve["solve_time"] < pid_times[pid]:
+            pid_times[pid] = solve["solve_time"]
+
+    fields = ["pid", "unique_name", "score", "name", "disabled", "category"]
+    problems = _get_catalog()["problems"]
+    result = [
+        {field: problems[pid][field] for field in fields}
+        for pid in problems
+        if pid in pid_times and (show_disabled or not problems[pid]["disabled"])
+    ]
     for p in result:
-        p["solve_time"] = pid_times[p["pid"]]
+        p.update({"solved": True, "unlocked": True, "solve_time": pid_times[p["pid"]]})
     return result
 
 
@@ -394,22 +645,13 @@ def is_problem_unlocked(problem, solved):
         problem: the problem object to check
         solved: the list of solved problem objects
     """
-    unlocked = True
-
-    for bundle in api.bundles.get_all_bundles():
-        if "dependencies" in bundle and bundle["dependencies_enabled"]:
-            if problem["unique_name"] in bundle["dependencies"]:
-                dependency = bundle["dependencies"][problem["unique_name"]]
-                weightsum = sum(
-                    dependency["weightmap"].get(p["unique_name"], 0) for p in solved
-                )
-                if weightsum < dependency["threshold"]:
-                    unlocked = False
+    locked = api.bundles.get_locked_problems([p["unique_name"] for p in solved])
+    return problem["unique_name"] not in locked
 
-    return unlocked
 
-
-@memoize(timeout=3 * 24 * 60 * 60)
+@memoize(
+    timeout=3 * 24 * 60 * 60, local=True, tags=["team:{tid}"], single_flight=True
+)
 def get_unlocked_pids(tid):
     """
     Get the unlocked pids for a given team.
@@ -427,16 +669,17 @@ def get_unlocked_pids(tid):
     solved = get_solved_problems(tid=tid)
     team = api.team.get_team(tid)
 
-    unlocked = []
-    db = api.db.get_conn()
-    all_problems = list(db.problems.find({}, {"unique_name": 1, "pid": 1}))
-    for problem in all_problems:
-        if is_problem_unlocked(problem, solved):
-            unlocked.append(problem["pid"])
-
-    for pid in unlocked:
-        if pid not in team["instances"]:
-            assign_instance_to_team(pid, tid)
+    locked = api.bundles.get_locked_problems([p["unique_name"] for p in solved])
+
+    unlocked = [
+        problem["pid"]
+        for problem in _get_catalog()["problems"].values()
+        if problem["unique_name"] not in locked
+    ]
+
+    missing = [pid for pid in unlocked if pid not in team["instances"]]
+    if missing:
+        assign_instances_to_team(missing, tid)
     return unlocked
 
 
@@ -455,6 +698,7 @@ def load_published(data):
             api.bundles.upsert_bundle(bundle)
 
     api.cache.clear()
+    bump_catalog_version()
 
 
 def sanitize_problem_data(data):
@@ -532,6 +776,7 @@ def set_problem_availability(pid, disabled):
         return None
     else:
         api.cache.clear()
+        bump_catalog_version()
         return pid
 
 
@@ -568,3 +813,4 @@ def unlock_walkthrough(uid, pid, cost):
         {"uid": uid, "tokens": {"$gte": cost}, "unlocked_walkthroughs": {"$ne": pid}},
         {"$addToSet": {"unlocked_walkthroughs": pid}, "$inc": {"tokens": (cost * -1)}},
     )
+    api.cache.drop_request_cached("user")
@@ -57,6 +57,35 @@ def get_problem_feedback(pid=None, tid=None, uid=None, count_only=False):
         return list(db.problem_feedback.find(match, {"_id": 0}))
 
 
+def get_problem_feedback_counts():
+    """
+    Sum the likes and dislikes of every problem with feedback.
+
+    Returns:
+        dict of pids to {"likes": int, "dislikes": int}
+    """
+    db = api.db.get_conn()
+    counts = db.problem_feedback.aggregate(
+        [
+            {
+                "$group": {
+                    "_id": "$pid",
+                    "likes": {
+                        "$sum": {"$cond": [{"$eq": ["$feedback.liked", True]}, 1, 0]}
+                    },
+                    "dislikes": {
+                        "$sum": {"$cond": [{"$eq": ["$feedback.liked", False]}, 1, 0]}
+                    },
+                }
+            }
+        ]
+    )
+    return {
+        count["_id"]: {"likes": count["likes"], "dislikes": count["dislikes"]}
+        for count in counts
+    }
+
+
 @log_action
 def upsert_feedback(pid, feedback):
     """
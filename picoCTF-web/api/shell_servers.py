@@ -340,6 +340,7 @@ def reassign_teams(include_assigned=False):
                 {"tid": team["tid"]},
                 {"$set": {"server_number": server_number, "instances": {}}},
             )
+            api.cache.drop_request_cached("team")
             # Re-assign instances
             api.problem.get_unlocked_pids(team["tid"])
 
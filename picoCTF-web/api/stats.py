@@ -3,13 +3,14 @@
 import datetime
 import math
 import pymongo
+import time
 
 import api
+from flask import json
 from api.cache import (
-    decode_scoreboard_item,
+    decode_scoreboard_items,
     get_score_cache,
     get_scoreboard_cache,
-    get_scoreboard_key,
     memoize,
     search_scoreboard_cache,
 )
@@ -17,6 +18,14 @@ from api import PicoException
 
 
 SCOREBOARD_PAGE_LEN = 50
+# How long a rendered scoreboard page is kept
+SCOREBOARD_PAGE_TIMEOUT = 10 * 60
+# Redis hash of the number of teams which solved each problem
+PROBLEM_SOLVES_KEY = "problem_solves"
+# Number of users read and scored at a time by the analytics exports
+EXPORT_BATCH_SIZE = 1000
+# How long a score progression list is kept after it was built
+PROGRESSION_TIMEOUT = 3 * 24 * 60 * 60
 
 
 def _get_problem_names(problems):
@@ -54,25 +63,183 @@ def get_score(tid=None, uid=None, time_weighted=True):
 
     # Not cached
     if score is None:
-        solved_problems = api.problem.get_solved_problems(**solved_args)
-        score = sum([problem["score"] for problem in solved_problems])
-        time_weight = 0
-        if score > 0:
-            sorted_solves = sorted(
-                solved_problems, key=lambda p: p["solve_time"], reverse=True
-            )
-            last_submitted = sorted_solves[0]["solve_time"]
-            # Weight returns a float based on last submission time.
-            # Math is safe for next 2 centuries
-            time_weight = 1 - (int(last_submitted.strftime("%s")) * 1e-10)
-        score += time_weight
-        score_cache.add({cache_key: score})
+        score, pids = _compute_score(**solved_args)
+        api.cache.cache_score(cache_key, score, pids)
     if time_weighted:
         return score
     else:
         return int(score)
 
 
+def get_team_scores(tids):
+    """
+    Get the time weighted scores of several teams.
+
+    Cached scores are read in a single round trip to redis.
+
+    Args:
+        tids: list of team ids
+    Returns:
+        list of scores, in the same order
+    """
+    return _get_scores("tid", tids)
+
+
+def get_user_scores(uids):
+    """
+    Get the time weighted scores of several users.
+
+    Cached scores are read in a single round trip to redis.
+
+    Args:
+        uids: list of user ids
+    Returns:
+        list of scores, in the same order
+    """
+    return _get_scores("uid", uids)
+
+
+def _get_scores(arg, keys):
+    pipe = api.cache.get_conn().pipeline(transaction=False)
+    for key in keys:
+        pipe.zscore(get_score_cache().key, key)
+    return [
+        get_score(**{arg: key}) if score is None else score
+        for key, score in zip(keys, pipe.execute())
+    ]
+
+
+def _compute_score(**solved_args):
+    """
+    Compute a time weighted score from the solved problems.
+
+    Returns:
+        (score, list of the pids it counts)
+    """
+    solved_problems = api.problem.get_solved_problems(**solved_args)
+    score = sum([problem["score"] for problem in solved_problems])
+    if score > 0:
+        last_submitted = max(problem["solve_time"] for problem in solved_problems)
+        score += get_time_weight(last_submitted)
+    return score, [problem["pid"] for problem in solved_problems]
+
+
+def get_time_weight(solve_time):
+    """
+    Get the decimal weight of a score given its last solve time.
+
+    Earlier solves weigh more, breaking ties between equal scores.
+    """
+    # Math is safe for next 2 centuries
+    return 1 - (int(solve_time.strftime("%s")) * 1e-10)
+
+
+def add_solve_to_score(tid, pid, solve_time):
+    """
+    Update the cached scores and score progressions for a new solve.
+
+    Covers the team and its members. Scores and progressions which are not
+    cached are computed on their next lookup instead.
+
+    Args:
+        tid: the team which solved the problem for the first time
+        pid: the solved problem
+        solve_time: time of the correct submission
+    """
+    problem = api.problem.get_problem(pid, {"score": 1, "disabled": 1})
+    if problem is None or problem["disabled"]:
+        return
+    uids = api.team.get_team_uids(tid)
+    keys = [tid]
+    progression_keys = [api.cache.get_progression_key(tid=tid)]
+    for uid in uids:
+        keys += [uid, tid + uid]
+        progression_keys += [
+            api.cache.get_progression_key(uid=uid),
+            api.cache.get_progression_key(tid=tid, uid=uid),
+        ]
+    api.cache.increment_scores(keys, pid, problem["score"], get_time_weight(solve_time))
+    api.cache.append_progressions(
+        progression_keys,
+        pid,
+        problem["score"],
+        int(solve_time.timestamp()),
+        PROGRESSION_TIMEOUT,
+    )
+
+
+def get_team_scoreboard_keys(tid):
+    """
+    Get the keys of every scoreboard a team appears on.
+
+    These are the scoreboards the team is eligible for, unless it is
+    exclusively a member of hidden groups, and the scoreboards of groups it
+    is a member of.
+
+    Args:
+        tid: the team id
+    Returns:
+        list of get_scoreboard_cache kwargs
+    """
+    db = api.db.get_conn()
+    team = api.team.get_team(tid=tid)
+    groups = list(
+        db.groups.find(
+            {"$or": [{"owner": tid}, {"teachers": tid}, {"members": tid}]},
+            {"_id": 0, "gid": 1, "members": 1, "settings.hidden": 1},
+        )
+    )
+
+    scoreboard_keys = [
+        {"group_id": group["gid"]} for group in groups if tid in group["members"]
+    ]
+    if len(groups) == 0 or any(not group["settings"]["hidden"] for group in groups):
+        scoreboard_keys += [
+            {"scoreboard_id": sid} for sid in team.get("eligibilities", [])
+        ]
+    return scoreboard_keys
+
+
+def add_solve_to_scoreboards(tid):
+    """
+    Write a team's current score into every scoreboard it appears on.
+
+    Keeps scoreboards live between cache_stats rebuilds.
+
+    Args:
+        tid: the team which solved a problem
+    """
+    api.cache.update_scoreboards(
+        get_team_scoreboard_keys(tid), api.team.get_team(tid=tid), get_score(tid=tid)
+    )
+
+
+def reconcile_scores(fix=False):
+    """
+    Check the cached scores of all teams and users against a full recompute.
+
+    Args:
+        fix: replace mismatched cached scores with the recomputed ones
+    Returns:
+        list of {key, cached, expected} for every mismatched cached score
+    """
+    score_cache = get_score_cache()
+    entities = [("tid", team["tid"]) for team in api.team.get_all_teams()] + [
+        ("uid", user["uid"]) for user in api.user.get_all_users()
+    ]
+    mismatches = []
+    for arg, key in entities:
+        cached = score_cache.score(key)
+        if cached is None:
+            continue
+        expected, pids = _compute_score(**{arg: key})
+        if int(cached) != int(expected) or abs(cached - expected) > 1e-9:
+            mismatches.append({"key": key, "cached": cached, "expected": expected})
+            if fix:
+                api.cache.cache_score(key, expected, pids)
+    return mismatches
+
+
 def get_team_review_count(tid=None, uid=None):
     """
     Get the count of reviewed problems for a user or team.
@@ -93,32 +260,48 @@ def get_team_review_count(tid=None, uid=None):
 
 
 # Stored by the cache_stats daemon.
-def get_group_scores(gid=None, name=None):
+def get_group_scores(gid=None, name=None, rebuild=False):
     """
     Get the group scores.
 
+    The scoreboard is only rebuilt when the group's membership changed since
+    it was last built. Solves keep it up to date in between.
+
     Args:
         gid: The group id
         name: The group name
+        rebuild: rebuild the scoreboard even if the membership is unchanged
     Returns:
         A dictionary containing name, tid, and score
     """
     key_args = {"group_id": gid}
     scoreboard_cache = get_scoreboard_cache(**key_args)
-    scoreboard_cache.clear()
+    built_version_key = "{}:version".format(scoreboard_cache.key)
 
-    member_teams = [
-        api.team.get_team(tid=tid) for tid in api.group.get_group(gid=gid)["members"]
-    ]
+    conn = api.cache.get_conn()
+    version = api.group.get_membership_version(gid)
+    built_version = conn.get(built_version_key)
+    if not rebuild and built_version is not None and int(built_version) == version:
+        return scoreboard_cache
 
-    result = {}
-    for team in member_teams:
-        if team["size"] > 0:
-            score = get_score(tid=team["tid"])
-            key = get_scoreboard_key(team)
-            result[key] = score
-    if result:
-        scoreboard_cache.add(result)
+    db = api.db.get_conn()
+    member_teams = list(
+        db.teams.find(
+            {
+                "tid": {"$in": api.group.get_group(gid=gid)["members"]},
+                "size": {"$gt": 0},
+            },
+            {"_id": 0, "tid": 1, "team_name": 1, "affiliation": 1},
+        )
+    )
+    scores = get_team_scores([team["tid"] for team in member_teams])
+
+    pipe = conn.pipeline()
+    api.cache.replace_scoreboard(
+        pipe, scoreboard_cache, list(zip(member_teams, scores))
+    )
+    pipe.set(built_version_key, version)
+    pipe.execute()
 
     return scoreboard_cache
 
@@ -139,7 +322,7 @@ def get_group_average_score(gid=None, name=None):
     return int(total_score / len(group_scores)) if len(group_scores) > 0 else 0
 
 
-# Stored by the cache_stats daemon
+# Kept live by add_solve_to_scoreboards, rebuilt by the cache_stats daemon
 def get_all_team_scores(scoreboard_id=None):
     """
     Get the score for every team in the database.
@@ -155,30 +338,17 @@ def get_all_team_scores(scoreboard_id=None):
     teams = api.team.get_all_teams(**key_args)
     scoreboard_cache = get_scoreboard_cache(**key_args)
 
-    result = {}
-    all_groups = api.group.get_all_groups()
+    result = []
+    hidden_tids = api.group.get_hidden_tids()
     for team in teams:
-        # Get the full version of the group.
-        groups = [
-            group
-            for group in all_groups
-            if team["tid"] in group["members"]
-            or team["tid"] in group["teachers"]
-            or team["tid"] == group["owner"]
-        ]
-
-        # Determine if the user is exclusively a member of hidden groups.
-        # If they are, they won't be processed.
-        if len(groups) == 0 or any(
-            [not (group["settings"]["hidden"]) for group in groups]
-        ):
+        # Skip teams which are exclusively members of hidden groups
+        if team["tid"] not in hidden_tids:
             score = get_score(tid=team["tid"])
             if score > 0:
-                key = get_scoreboard_key(team=team)
-                result[key] = score
-    scoreboard_cache.clear()
-    if result:
-        scoreboard_cache.add(result)
+                result.append((team, score))
+    pipe = api.cache.get_conn().pipeline()
+    api.cache.replace_scoreboard(pipe, scoreboard_cache, result)
+    pipe.execute()
     return scoreboard_cache
 
 
@@ -190,21 +360,45 @@ def get_all_user_scores():
         A list of dictionaries with name and score
 
     """
-    users = api.user.get_all_users()
+    return sorted(iter_all_user_scores(), key=lambda item: item["score"], reverse=True)
 
-    result = []
-    for user in users:
-        result.append(
-            {
-                "name": user["username"],
-                "score": get_score(uid=user["uid"], time_weighted=False),
-            }
-        )
 
-    return sorted(result, key=lambda item: item["score"], reverse=True)
+def iter_all_user_scores(batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generate the score of every user in the database, in no particular order.
+
+    Args:
+        batch_size: number of users to read and score at a time
+    Yields:
+        dictionaries with name and score
+    """
+    for user, score in _iter_user_scores({"username": 1}, batch_size):
+        yield {"name": user["username"], "score": int(score)}
+
 
+def _iter_user_scores(projection, batch_size):
+    """
+    Walk all users with a cursor, scoring them a batch at a time.
 
-@memoize(timeout=120)
+    Args:
+        projection: user fields to load, besides the uid
+        batch_size: number of users to read and score at a time
+    Yields:
+        (user, time weighted score) tuples
+    """
+    db = api.db.get_conn()
+    cursor = db.users.find({}, dict(projection, _id=0, uid=1)).batch_size(batch_size)
+    batch = []
+    for user in cursor:
+        batch.append(user)
+        if len(batch) == batch_size:
+            yield from zip(batch, get_user_scores([u["uid"] for u in batch]))
+            batch = []
+    if batch:
+        yield from zip(batch, get_user_scores([u["uid"] for u in batch]))
+
+
+@memoize(timeout=120, local=True, single_flight=True, early_refresh=1.0)
 def get_problems_by_category():
     """
     Get the list of all problems divided into categories.
@@ -252,17 +446,66 @@ def get_problem_submission_stats(pid=None):
     Returns:
         Dict of {valid: #, invalid: #}
     """
+    db = api.db.get_conn()
     return {
-        "valid": len(api.submissions.get_submissions(pid, correctness=True)),
-        "invalid": len(api.submissions.get_submissions(pid, correctness=False)),
+        "valid": db.submissions.count_documents({"pid": pid, "correct": True}),
+        "invalid": db.submissions.count_documents({"pid": pid, "correct": False}),
     }
 
 
-@memoize(timeout=3 * 24 * 60 * 60)
-def get_score_progression(tid=None, uid=None, category=None):
+def get_submission_stats(group_by="pid", start=None, end=None, category=None):
+    """
+    Count the valid and invalid submissions for all problems at once.
+
+    Counted by a single aggregation, so no submissions leave the database.
+
+    Args:
+        group_by: break the counts down by "pid" or by "category"
+        start: only count submissions made at or after this datetime
+        end: only count submissions made before this datetime
+        category: only count submissions to problems in this category
+    Returns:
+        Dict of {pid or category: {valid: #, invalid: #}}, for every pid or
+        category with at least one matching submission
+    """
+    db = api.db.get_conn()
+    match = {}
+    if start is not None or end is not None:
+        match["timestamp"] = {}
+        if start is not None:
+            match["timestamp"]["$gte"] = start
+        if end is not None:
+            match["timestamp"]["$lt"] = end
+    if category is not None:
+        match["category"] = category
+
+    stats = {}
+    for result in db.submissions.aggregate(
+        [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"key": "$" + group_by, "correct": "$correct"},
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+    ):
+        counts = stats.setdefault(result["_id"]["key"], {"valid": 0, "invalid": 0})
+        counts["valid" if result["_id"]["correct"] else "invalid"] = result["count"]
+    return stats
+
+
+def get_score_progression(
+    tid=None, uid=None, category=None, since=None, max_points=None
+):
     """
     Find the score and time after each correct submission of a team or user.
 
+    Progressions across all categories are kept in redis lists, which are
+    appended to at solve time. They are only built from the solved problems
+    on first lookup, or after a team change drops them.
+
     NOTE: this is slower than get_score.
           Do not use this for getting current score.
 
@@ -270,9 +513,83 @@ def get_score_progression(tid=None, uid=None, category=None):
         tid: the tid of the user
         uid: the uid of the user
         category: category filter
+        since: only include solves after this unix time
+        max_points: downsample to at most this many points
     Returns:
         A list of dictionaries containing score and time
     """
+    if category is None:
+        progression = _get_progression_timeline(tid=tid, uid=uid)
+    else:
+        progression = _get_category_score_progression(
+            tid=tid, uid=uid, category=category
+        )
+
+    if since is not None:
+        progression = [point for point in progression if point["time"] > since]
+    if max_points is not None:
+        progression = _downsample(progression, max_points)
+    return progression
+
+
+def _get_progression_timeline(tid=None, uid=None):
+    """Read a score progression list, building it if it does not exist."""
+    key = api.cache.get_progression_key(tid=tid, uid=uid)
+    conn = api.cache.get_conn()
+    entries = conn.lrange(key, 0, -1)
+    if entries:
+        progression = []
+        for entry in entries[1:]:
+            time, score = entry.decode("utf-8").split(":")
+            progression.append({"score": int(score), "time": int(time)})
+        return progression
+
+    solved = api.problem.get_solved_problems(tid=tid, uid=uid)
+    progression = _score_progression(solved)
+    api.cache.cache_progression(
+        key,
+        ["{time}:{score}".format(**point) for point in progression],
+        [problem["pid"] for problem in solved],
+        PROGRESSION_TIMEOUT,
+    )
+    return progression
+
+
+def drop_score_progressions(tid):
+    """
+    Drop the score progression lists of a team and its members.
+
+    They are rebuilt on their next lookup.
+
+    Args:
+        tid: the team id
+    """
+    keys = [api.cache.get_progression_key(tid=tid)]
+    for uid in api.team.get_team_uids(tid):
+        keys += [
+            api.cache.get_progression_key(uid=uid),
+            api.cache.get_progression_key(tid=tid, uid=uid),
+        ]
+    api.cache.drop_progressions(keys)
+
+
+def _downsample(progression, max_points):
+    """Pick at most max_points evenly spaced points, keeping the latest."""
+    if len(progression) <= max_points:
+        return progression
+    if max_points == 1:
+        return progression[-1:]
+    step = (len(progression) - 1) / (max_points - 1)
+    return [progression[round(i * step)] for i in range(max_points)]
+
+
+@memoize(timeout=3 * 24 * 60 * 60, tags=["team:{tid}", "user:{uid}"])
+def _get_category_score_progression(tid=None, uid=None, category=None):
+    return _compute_score_progression(tid=tid, uid=uid, category=category)
+
+
+def _compute_score_progression(tid=None, uid=None, category=None):
+    """Compute a score progression from the solved problems."""
     solved_kwargs = {}
     if tid is not None:
         solved_kwargs["tid"] = tid
@@ -280,8 +597,11 @@ def get_score_progression(tid=None, uid=None, category=None):
         solved_kwargs["uid"] = uid
     if category is not None:
         solved_kwargs["category"] = category
-    solved = api.problem.get_solved_problems(**solved_kwargs)
+    return _score_progression(api.problem.get_solved_problems(**solved_kwargs))
+
 
+def _score_progression(solved):
+    """Build a score progression from a list of solved problems."""
     result = []
     score = 0
 
@@ -296,18 +616,68 @@ def get_score_progression(tid=None, uid=None, category=None):
     return result
 
 
-# Stored by the cache_stats daemon
-@memoize
 def get_problem_solves(pid):
     """
-    Return the number of solves for a particular problem.
+    Return the number of teams which solved a particular problem.
 
     Args:
         pid: pid of the problem
     """
+    count = api.cache.get_conn().hget(PROBLEM_SOLVES_KEY, pid)
+    if count is None:
+        return get_all_problem_solves().get(pid, 0)
+    return int(count)
+
+
+def get_all_problem_solves():
+    """
+    Return the number of teams which solved each problem.
+
+    The counters are kept in a redis hash, incremented by add_problem_solve.
+    They are rebuilt if missing.
+
+    Returns:
+        Dict of {pid: #}
+    """
+    solves = api.cache.get_conn().hgetall(PROBLEM_SOLVES_KEY)
+    if not solves:
+        return rebuild_problem_solves()
+    return {pid.decode("utf-8"): int(count) for pid, count in solves.items()}
+
+
+def add_problem_solve(pid):
+    """
+    Count a team's first solve of a problem.
+
+    Args:
+        pid: the solved problem
+    """
+    api.cache.increment_if_exists(PROBLEM_SOLVES_KEY, pid)
+
+
+def rebuild_problem_solves():
+    """
+    Recompute the solve counters of all problems with a single aggregation.
+
+    Returns:
+        Dict of {pid: #}
+    """
     db = api.db.get_conn()
+    solves = {problem["pid"]: 0 for problem in db.problems.find({}, {"pid": 1})}
+    for result in db.solves.aggregate(
+        [
+            {"$group": {"_id": {"pid": "$pid", "tid": "$tid"}}},
+            {"$group": {"_id": "$_id.pid", "count": {"$sum": 1}}},
+        ]
+    ):
+        solves[result["_id"]] = result["count"]
 
-    return db.submissions.count({"pid": pid, "correct": True})
+    pipe = api.cache.get_conn().pipeline()
+    pipe.delete(PROBLEM_SOLVES_KEY)
+    if solves:
+        pipe.hset(PROBLEM_SOLVES_KEY, mapping=solves)
+    pipe.execute()
+    return solves
 
 
 # Stored by the cache_stats daemon
@@ -329,8 +699,7 @@ def get_top_teams_score_progressions(limit=5, scoreboard_id=None, group_id=None)
 
     """
 
-    def output_item(item):
-        data = decode_scoreboard_item(item)
+    def output_item(data):
         return {
             "name": data["name"],
             "affiliation": data["affiliation"],
@@ -343,32 +712,62 @@ def get_top_teams_score_progressions(limit=5, scoreboard_id=None, group_id=None)
         scoreboard_cache = get_group_scores(gid=group_id)
 
     team_items = scoreboard_cache.range(0, limit - 1, with_scores=True, desc=True)
-    return [output_item(team_item) for team_item in team_items]
+    return [output_item(data) for data in decode_scoreboard_items(team_items)]
 
 
 # Stored by the cache_stats daemon.
 @memoize
 def get_registration_count():
-    """Get the user, team, and group counts."""
+    """
+    Get the user, team, and group counts.
+
+    Teams other than the users' own single player teams, and the users on
+    them, are counted by a single aggregation.
+
+    Returns:
+        Dict of the counts, and the unix time they were last updated
+    """
     db = api.db.get_conn()
-    users = db.users.count()
     stats = {
-        "users": users,
-        "teams": db.teams.count() - users,
-        "groups": db.groups.count(),
-        "teachers": db.users.count({"usertype": "teacher"}),
+        "users": db.users.count_documents({}),
+        "teams": 0,
+        "groups": db.groups.count_documents({}),
+        "teachers": db.users.count_documents({"usertype": "teacher"}),
+        "teamed_users": 0,
     }
-    usernames = set(db.users.distinct("username"))
-    team_names = set(db.teams.distinct("team_name"))
-
-    real_team_names = team_names - usernames
-    real_team_ids = [
-        t["tid"]
-        for t in list(db.teams.find({"team_name": {"$in": list(real_team_names)}}))
-    ]
-
-    teamed_users = db.users.count({"tid": {"$in": real_team_ids}})
-    stats["teamed_users"] = teamed_users
+    for result in db.teams.aggregate(
+        [
+            # Single player teams are named after their user
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "team_name",
+                    "foreignField": "username",
+                    "as": "user",
+                }
+            },
+            {"$match": {"user": {"$size": 0}}},
+            {
+                "$lookup": {
+                    "from": "users",
+                    "localField": "tid",
+                    "foreignField": "tid",
+                    "as": "members",
+                }
+            },
+            {"$project": {"size": {"$size": "$members"}}},
+            {
+                "$group": {
+                    "_id": None,
+                    "teams": {"$sum": 1},
+                    "teamed_users": {"$sum": "$size"},
+                }
+            },
+        ]
+    ):
+        stats["teams"] = result["teams"]
+        stats["teamed_users"] = result["teamed_users"]
+    stats["last_updated"] = int(time.time())
 
     return stats
 
@@ -392,26 +791,78 @@ def get_scoreboard_page(scoreboard_key, page_number=None):
     """
     board_cache = get_scoreboard_cache(**scoreboard_key)
     if not page_number:
-        try:
-            user = api.user.get_user()
-            team = api.team.get_team(tid=user["tid"])
-            team_position = (
-                board_cache.rank(get_scoreboard_key(team), reverse=True) or 0
-            )
-            page_number = math.floor(team_position / SCOREBOARD_PAGE_LEN) + 1
-        except PicoException:
-            page_number = 1
+        page_number = _get_current_team_page(board_cache)
     start = SCOREBOARD_PAGE_LEN * (page_number - 1)
     end = start + SCOREBOARD_PAGE_LEN - 1
-    board_page = [
-        decode_scoreboard_item(item)
-        for item in board_cache.range(start, end, with_scores=True, reverse=True)
-    ]
+    board_page = decode_scoreboard_items(
+        board_cache.range(start, end, with_scores=True, reverse=True)
+    )
 
     available_pages = max(math.ceil(len(board_cache) / SCOREBOARD_PAGE_LEN), 1)
     return board_page, page_number, available_pages
 
 
+def _get_current_team_page(board_cache):
+    """Get the page of a scoreboard containing the current team, or 1."""
+    try:
+        user = api.user.get_user()
+        team_position = board_cache.rank(user["tid"], reverse=True) or 0
+        return math.floor(team_position / SCOREBOARD_PAGE_LEN) + 1
+    except PicoException:
+        return 1
+
+
+def get_scoreboard_page_version(scoreboard_key, page_number=None):
+    """
+    Resolve a scoreboard page and tag the version of its contents.
+
+    Args:
+        scoreboard_key (dict): scoreboard key
+
+    Kwargs:
+        page_number (int): page to retrieve, defaults to None (which attempts
+                     to return the current team's page)
+
+    Returns:
+        (int: page number, str: version tag, usable as an ETag)
+    """
+    board_cache = get_scoreboard_cache(**scoreboard_key)
+    if not page_number:
+        page_number = _get_current_team_page(board_cache)
+    version = api.cache.get_scoreboard_version(board_cache)
+    return page_number, "{}-{}".format(version, page_number)
+
+
+def get_rendered_scoreboard_page(scoreboard_key, page_number, version):
+    """
+    Get a scoreboard page serialized as JSON.
+
+    Rendered pages are cached per version, so each page is only built once
+    after any score on the scoreboard changes.
+
+    Args:
+        scoreboard_key (dict): scoreboard key
+        page_number (int): page to retrieve
+        version (str): version tag from get_scoreboard_page_version
+
+    Returns:
+        str: JSON of {scoreboard, current_page, total_pages}
+    """
+    board_cache = get_scoreboard_cache(**scoreboard_key)
+    conn = api.cache.get_conn()
+    page_key = "{}:page:{}".format(board_cache.key, version)
+    body = conn.get(page_key)
+    if body is not None:
+        return body.decode("utf-8")
+
+    page = get_scoreboard_page(scoreboard_key, page_number)
+    body = json.dumps(
+        {"scoreboard": page[0], "current_page": page[1], "total_pages": page[2]}
+    )
+    conn.set(page_key, body, ex=SCOREBOARD_PAGE_TIMEOUT)
+    return body
+
+
 def get_filtered_scoreboard_page(scoreboard_key, pattern, page_number=1):
     """
     Get a page of a filtered scoreboard.
@@ -432,33 +883,43 @@ def get_filtered_scoreboard_page(scoreboard_key, pattern, page_number=1):
         (list: scoreboard page, int: current page, int: number of pages)
     """
     board_cache = get_scoreboard_cache(**scoreboard_key)
-    results = search_scoreboard_cache(board_cache, pattern)
     start = SCOREBOARD_PAGE_LEN * (page_number - 1)
     end = start + SCOREBOARD_PAGE_LEN
-    board_page = results[start:end]
+    board_page, total = search_scoreboard_cache(board_cache, pattern, start, end)
+    pipe = api.cache.get_conn().pipeline(transaction=False)
     for item in board_page:
-        item["rank"] = board_cache.rank(item["key"], reverse=True) + 1
+        pipe.zrevrank(board_cache.key, item["tid"])
+    for item, rank in zip(board_page, pipe.execute()):
+        item["rank"] = rank + 1
         item["score"] = int(item["score"])
-        item.pop("key")
-    available_pages = max(math.ceil(len(results) / SCOREBOARD_PAGE_LEN), 1)
+    available_pages = max(math.ceil(total / SCOREBOARD_PAGE_LEN), 1)
     return (board_page, page_number, available_pages)
 
 
 def get_demographic_data():
     """Get demographic information used in analytics"""
-    users = api.user.get_all_users()
+    return list(iter_demographic_data())
 
-    result = []
-    for user in users:
-        result.append(
-            {
-                "usertype": user["usertype"],
-                "country": user["country"],
-                "gender": user["demo"].get("gender", ""),
-                "zipcode": user["demo"].get("zipcode", ""),
-                "grade": user["demo"].get("grade", ""),
-                "score": get_score(uid=user["uid"], time_weighted=False),
-            }
-        )
 
-    return result
+def iter_demographic_data(batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generate the demographic information of every user.
+
+    Users are read with a cursor and scored a batch at a time, so memory use
+    does not grow with the number of users.
+
+    Args:
+        batch_size: number of users to read and score at a time
+    Yields:
+        dictionaries of demographic information and score
+    """
+    projection = {"usertype": 1, "country": 1, "demo": 1}
+    for user, score in _iter_user_scores(projection, batch_size):
+        yield {
+            "usertype": user["usertype"],
+            "country": user["country"],
+            "gender": user["demo"].get("gender", ""),
+            "zipcode": user["demo"].get("zipcode", ""),
+            "grade": user["demo"].get("grade", ""),
+            "score": int(score),
+        }
@@ -2,6 +2,8 @@
 
 from datetime import datetime
 
+import pymongo
+
 import api
 from api import cache, check, log_action, PicoException, validate
 from api.cache import memoize
@@ -41,20 +43,14 @@ def grade_problem(pid, key, tid=None):
     if tid is None:
         tid = api.user.get_user()["tid"]
 
-    problem = api.problem.get_problem(pid)
     assigned_instance = api.problem.get_instance_data(pid, tid)
+    iids = api.problem.find_flag_instances(pid, key)
 
-    suspicious = False
-    correct = assigned_instance["flag"] in key
+    correct = assigned_instance["iid"] in iids
     if not correct and DEBUG_KEY is not None:
         correct = DEBUG_KEY in key
-    if not correct:
-        other_instance_flags = [
-            instance["flag"]
-            for instance in problem["instances"]
-            if instance["iid"] != assigned_instance["iid"]
-        ]
-        suspicious = any([flag in key for flag in other_instance_flags])
+    # Suspicious if the key holds the flag of another team's instance
+    suspicious = not correct and len(iids) > 0
 
     return (correct, suspicious)
 
@@ -94,39 +90,39 @@ def submit_key(tid, pid, key, method, uid, ip=None):
     )
 
     correct, suspicious = grade_problem(pid, key, tid)
+    timestamp = datetime.utcnow()
 
     if not previously_solved_by_user:
+        problem = api.problem.get_problem(pid, {"category": 1, "score": 1})
         db.submissions.insert(
             {
                 "uid": uid,
                 "tid": tid,
-                "timestamp": datetime.utcnow(),
+                "timestamp": timestamp,
                 "pid": pid,
                 "ip": ip,
                 "key": key,
                 "method": method,
-                "category": api.problem.get_problem(pid, {"category": 1})["category"],
+                "category": problem["category"],
                 "correct": correct,
                 "suspicious": suspicious,
             }
         )
+        if correct:
+            add_solve(uid, tid, pid, problem, timestamp)
 
     if correct and not previously_solved_by_team:
-        # Immediately invalidate some caches
-        cache.invalidate(api.stats.get_score, tid)
-        cache.invalidate(api.stats.get_score, uid)
-        cache.invalidate(api.problem.get_unlocked_pids, tid)
-        cache.invalidate(
-            api.problem.get_solved_problems, tid=tid, uid=uid, category=None
-        )
-        cache.invalidate(
-            api.problem.get_solved_problems, tid=tid, uid=None, category=None
+        # Drop the team's memoized results first, so that scores recomputed
+        # below count the solve. Results looked up by uid cover the whole
+        # team, so drop every member's too.
+        cache.invalidate_tags(
+            "team:{}".format(tid),
+            *["user:{}".format(member) for member in api.team.get_team_uids(tid)]
         )
-        cache.invalidate(api.problem.get_solved_problems, tid=tid, uid=uid)
-        cache.invalidate(api.problem.get_solved_problems, tid=tid)
-        cache.invalidate(api.problem.get_solved_problems, uid=uid)
-        cache.invalidate(api.stats.get_score_progression, tid=tid, category=None)
-        cache.invalidate(api.stats.get_score_progression, tid=tid)
+        # Immediately update some caches
+        api.stats.add_solve_to_score(tid, pid, timestamp)
+        api.stats.add_solve_to_scoreboards(tid)
+        api.stats.add_problem_solve(pid)
 
     # if the solve is correct there is no need to maintain the container
     if correct:
@@ -190,16 +186,135 @@ def get_submissions(
 def get_suspicious_submissions(tid):
     """Get the suspicious submissions for a given team."""
     submissions = get_submissions(tid=tid, suspicious=True)
-    for submission in submissions:
-        submission["problem_name"] = api.problem.get_problem(submission["pid"])["name"]
+
+    # The instances whose flag was submitted, and the teams they belong to
+    flag_iids = [
+        api.problem.find_flag_instances(submission["pid"], submission["key"])
+        for submission in submissions
+    ]
+    pid_iids = {}
+    for submission, iids in zip(submissions, flag_iids):
+        pid_iids.setdefault(submission["pid"], set()).update(iids)
+    owners = api.problem.get_instance_owners(pid_iids)
+
+    for submission, iids in zip(submissions, flag_iids):
+        submission["problem_name"] = api.problem.get_problem(
+            submission["pid"], {"name": 1}
+        )["name"]
+        submission["flag_owners"] = [
+            team["team_name"]
+            for iid in iids
+            for team in owners[iid]
+            if team["tid"] != tid
+        ]
     return submissions
 
 
+def add_solve(uid, tid, pid, problem, solve_time):
+    """
+    Record a user's first correct submission for a problem.
+
+    Args:
+        uid: the user id
+        tid: the user's team id at the time of the solve
+        pid: the problem id
+        problem: the problem dict, with its category and score
+        solve_time: time of the correct submission
+    """
+    db = api.db.get_conn()
+    db.solves.update_one(
+        {"uid": uid, "pid": pid},
+        {
+            "$setOnInsert": {
+                "tid": tid,
+                "category": problem["category"],
+                "score": problem["score"],
+                "solve_time": solve_time,
+            }
+        },
+        upsert=True,
+    )
+
+
+def get_solves(tid=None, uids=(), category=None):
+    """
+    Get the solves of a team and of a list of users.
+
+    Args:
+        tid: the team id
+        uids: the user ids
+        category: category filter
+    Returns:
+        A list of solves, with one entry per user and problem
+    """
+    db = api.db.get_conn()
+    match = {"$or": [{"uid": {"$in": list(uids)}}]}
+    if tid is not None:
+        match["$or"].append({"tid": tid})
+    if category is not None:
+        match["category"] = category
+    return list(db.solves.find(match, {"_id": 0}))
+
+
+def rebuild_solves():
+    """
+    Backfill the solves collection from the correct submissions.
+
+    Existing solves are kept, so this is safe to run on a live event.
+
+    Returns:
+        The number of solves which were added
+    """
+    db = api.db.get_conn()
+    problems = {
+        problem["pid"]: problem
+        for problem in db.problems.find({}, {"_id": 0, "pid": 1, "score": 1})
+    }
+    solves = db.submissions.aggregate(
+        [
+            {"$match": {"correct": True}},
+            {"$sort": {"timestamp": 1}},
+            {
+                "$group": {
+                    "_id": {"uid": "$uid", "pid": "$pid"},
+                    "tid": {"$first": "$tid"},
+                    "category": {"$first": "$category"},
+                    "solve_time": {"$first": "$timestamp"},
+                }
+            },
+        ],
+        allowDiskUse=True,
+    )
+    updates = []
+    for solve in solves:
+        problem = problems.get(solve["_id"]["pid"])
+        if problem is None:
+            continue
+        updates.append(
+            pymongo.UpdateOne(
+                solve["_id"],
+                {
+                    "$setOnInsert": {
+                        "tid": solve["tid"],
+                        "category": solve["category"],
+                        "score": problem["score"],
+                        "solve_time": solve["solve_time"],
+                    }
+                },
+                upsert=True,
+            )
+        )
+    if not updates:
+        return 0
+    return db.solves.bulk_write(updates, ordered=False).upserted_count
+
+
 def clear_all_submissions():
     """Remove all submissions from the database."""
     if DEBUG_KEY is not None:
         db = api.db.get_conn()
         db.submissions.remove()
+        db.solves.delete_many({})
         api.cache.clear()
     else:
         raise PicoException("Debug mode must be enabled", 500)
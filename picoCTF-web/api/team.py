@@ -48,17 +48,16 @@ def get_team(tid=None, name=None):
     """
     db = api.db.get_conn()
 
-    match = {}
-    if tid is not None:
-        match.update({"tid": tid})
-    elif name is not None:
-        match.update({"team_name": name})
-    elif api.user.is_logged_in():
-        match.update({"tid": api.user.get_user()["tid"]})
-    else:
-        return None
+    if tid is None and name is None:
+        if not api.user.is_logged_in():
+            return None
+        tid = api.user.get_user()["tid"]
 
-    return db.teams.find_one(match, {"_id": 0})
+    if tid is not None:
+        return cache.get_request_cached(
+            ("team", tid), lambda: db.teams.find_one({"tid": tid}, {"_id": 0})
+        )
+    return db.teams.find_one({"team_name": name}, {"_id": 0})
 
 
 def update_team(tid, updates):
@@ -76,13 +75,20 @@ def update_team(tid, updates):
     """
     db = api.db.get_conn()
     if len(updates) > 0:
-        success = db.teams.find_one_and_update({"tid": tid}, {"$set": updates})
-        if not success:
+        old_team = db.teams.find_one_and_update({"tid": tid}, {"$set": updates})
+        cache.drop_request_cached("team")
+        if not old_team:
             return None
+        if "team_name" in updates or "affiliation" in updates:
+            # Scoreboards list teams by tid, so only their display data and
+            # search index entries change
+            cache.reindex_scoreboard_team(
+                api.stats.get_team_scoreboard_keys(tid), old_team, get_team(tid=tid)
+            )
     return tid
 
 
-@memoize(timeout=5 * 24 * 60 * 60)
+@memoize(timeout=5 * 24 * 60 * 60, local=True)
 def get_groups(tid):
     """
     Get the group membership for a team.
@@ -400,6 +406,8 @@ def join_team(team_name, password, user):
     db.teams.find_one_and_update({"tid": desired_team["tid"]}, {"$inc": {"size": 1}})
 
     db.teams.find_one_and_update({"tid": current_team["tid"]}, {"$inc": {"size": -1}})
+    cache.drop_request_cached("user")
+    cache.drop_request_cached("team")
 
     # Remove old team from any groups and attempt to add new team
     previous_groups = get_groups(current_team["tid"])
@@ -418,28 +426,10 @@ def join_team(team_name, password, user):
     # Immediately invalidate some caches
     cache.invalidate(api.stats.get_score, desired_team["tid"])
     cache.invalidate(api.stats.get_score, user["uid"])
-    cache.invalidate(api.problem.get_unlocked_pids, desired_team["tid"])
-    cache.invalidate(
-        api.problem.get_solved_problems,
-        tid=desired_team["tid"],
-        uid=user["uid"],
-        category=None,
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems,
-        tid=desired_team["tid"],
-        uid=None,
-        category=None,
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=desired_team["tid"], uid=user["uid"]
-    )
-    cache.invalidate(api.problem.get_solved_problems, tid=desired_team["tid"])
-    cache.invalidate(api.problem.get_solved_problems, uid=user["uid"])
-    cache.invalidate(
-        api.stats.get_score_progression, tid=desired_team["tid"], category=None
+    cache.invalidate_tags(
+        "team:{}".format(desired_team["tid"]), "user:{}".format(user["uid"])
     )
-    cache.invalidate(api.stats.get_score_progression, tid=desired_team["tid"])
+    api.stats.drop_score_progressions(desired_team["tid"])
 
     return desired_team["tid"]
 
@@ -469,6 +459,7 @@ def update_password_request(params):
         {"tid": user["tid"]},
         {"$set": {"password": api.common.hash_password(params["new-password"])}},
     )
+    cache.drop_request_cached("team")
 
 
 def is_teacher_team(tid):
@@ -490,8 +481,10 @@ def delete_team(tid):
     """Scrub all traces of a team."""
     db = api.db.get_conn()
     db.submissions.delete_many({"tid": tid})
+    db.solves.delete_many({"tid": tid})
     db.problem_feedback.delete_many({"tid": tid})
     db.teams.find_one_and_delete({"tid": tid})
+    cache.drop_request_cached("team")
     for group in get_groups(tid):
         api.group.leave_group(group["gid"], tid)
     api.cache.invalidate(api.team.get_groups, tid)
@@ -546,6 +539,8 @@ def remove_member(tid, uid):
     db.teams.find_one_and_update({"tid": self_team_tid}, {"$inc": {"size": 1}})
 
     db.teams.find_one_and_update({"tid": tid}, {"$inc": {"size": -1}})
+    cache.drop_request_cached("user")
+    cache.drop_request_cached("team")
 
     # Delete the custom team if no members remain
     remaining_team_size = db.teams.find_one({"tid": tid}, {"size": 1})["size"]
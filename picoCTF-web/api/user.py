@@ -81,7 +81,10 @@ def get_user(name=None, uid=None, include_pw_hash=False):
         projection["password_hash"] = 0
 
     if uid is not None:
-        return db.users.find_one({"uid": uid}, projection)
+        return cache.get_request_cached(
+            ("user", uid, include_pw_hash),
+            lambda: db.users.find_one({"uid": uid}, projection),
+        )
     elif name is not None:
         return db.users.find_one(
             {"username": name},
@@ -89,7 +92,7 @@ def get_user(name=None, uid=None, include_pw_hash=False):
             collation=Collation(locale="en", strength=CollationStrength.PRIMARY),
         )
     elif api.user.is_logged_in():
-        return db.users.find_one({"uid": session["uid"]}, projection)
+        return get_user(uid=session["uid"], include_pw_hash=include_pw_hash)
     else:
         raise PicoException("Could not retrieve user - not logged in", 401)
 
@@ -278,6 +281,7 @@ def add_user(params, batch_registration=False):
         "tokens": 0,
     }
     db.users.insert_one(user)
+    cache.drop_request_cached("user")
 
     # Determine the user team's initial eligibilities
     initial_eligibilities = [
@@ -288,6 +292,7 @@ def add_user(params, batch_registration=False):
     db.teams.find_one_and_update(
         {"tid": tid}, {"$set": {"eligibilities": initial_eligibilities}}
     )
+    cache.drop_request_cached("team")
 
     # If gid was specified, add the newly created team to the group
     if params.get("gid", None):
@@ -339,6 +344,7 @@ def verify_user(uid, token_value):
         db.users.find_one_and_update(
             {"uid": current_user["uid"]}, {"$set": {"verified": True}}
         )
+        cache.drop_request_cached("user")
         api.token.delete_token({"uid": current_user["uid"]}, "email_verification")
         return True
     else:
@@ -377,6 +383,7 @@ def update_password_request(params, uid=None, check_current=False):
         {"uid": user["uid"]},
         {"$set": {"password_hash": api.common.hash_password(params["new-password"])}},
     )
+    cache.drop_request_cached("user")
 
 
 @log_action
@@ -421,6 +428,8 @@ def disable_account(uid, disable_reason=None):
     db.teams.find_one_and_update(
         {"tid": former_tid, "size": {"$gt": 0}}, {"$inc": {"size": -1}}
     )
+    cache.drop_request_cached("user")
+    cache.drop_request_cached("team")
 
     # Drop empty team from groups
     former_team = db.teams.find_one({"tid": former_tid})
@@ -433,18 +442,8 @@ def disable_account(uid, disable_reason=None):
     cache.invalidate(api.team.get_groups, former_tid)
     cache.invalidate(api.stats.get_score, former_tid)
     cache.invalidate(api.stats.get_score, uid)
-    cache.invalidate(api.problem.get_unlocked_pids, former_tid)
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=former_tid, uid=uid, category=None
-    )
-    cache.invalidate(
-        api.problem.get_solved_problems, tid=former_tid, uid=None, category=None
-    )
-    cache.invalidate(api.problem.get_solved_problems, tid=former_tid, uid=uid)
-    cache.invalidate(api.problem.get_solved_problems, tid=former_tid)
-    cache.invalidate(api.problem.get_solved_problems, uid=uid)
-    cache.invalidate(api.stats.get_score_progression, tid=former_tid, category=None)
-    cache.invalidate(api.stats.get_score_progression, tid=former_tid)
+    cache.invalidate_tags("team:{}".format(former_tid), "user:{}".format(uid))
+    api.stats.drop_score_progressions(former_tid)
 
 
 def update_extdata(params):
@@ -460,6 +459,7 @@ def update_extdata(params):
     user = get_user(uid=None)
     db = api.db.get_conn()
     db.users.update_one({"uid": user["uid"]}, {"$set": {"extdata": params}})
+    cache.drop_request_cached("user")
 
 
 def reset_password(token_value, password, confirm_password):
@@ -678,6 +678,6 @@ def can_leave_team(uid):
         return False
     if current_team["creator"] == uid and current_team["size"] != 1:
         return False
-    if len(api.submissions.get_submissions(uid=uid)) > 0:
+    if api.db.get_conn().submissions.find_one({"uid": uid}, {"_id": 1}):
         return False
     return True
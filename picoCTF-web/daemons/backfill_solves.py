@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""Backfill the solves collection from the correct submissions."""
+
+import argparse
+
+import api
+from api.submissions import rebuild_solves
+
+
+def run():
+    """Run the solves backfill."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    with api.create_app().app_context():
+        print("{} solve(s) added".format(rebuild_solves()))
+
+
+if __name__ == "__main__":
+    run()
@@ -6,9 +6,9 @@ import api.group
 from api.stats import (
     get_all_team_scores,
     get_group_scores,
-    get_problem_solves,
     get_registration_count,
     get_top_teams_score_progressions,
+    rebuild_problem_solves,
 )
 import socket
 
@@ -40,7 +40,9 @@ def run():
         print("Caching registration stats...")
         cache(get_registration_count)
 
-        print("Caching the scoreboards...")
+        # Solves update the scoreboards as they happen, so this only
+        # catches up on team, group and eligibility changes
+        print("Rebuilding the scoreboards...")
         for scoreboard in api.scoreboards.get_all_scoreboards():
             get_all_team_scores(scoreboard_id=scoreboard["sid"])
 
@@ -54,12 +56,13 @@ def run():
 
         print("Caching the scores and score progressions for each group...")
         for group in api.group.get_all_groups():
-            get_group_scores(gid=group["gid"])
+            get_group_scores(gid=group["gid"], rebuild=True)
             cache(get_top_teams_score_progressions, limit=5, group_id=group["gid"])
 
-        print("Caching number of solves for each problem...")
+        print("Rebuilding number of solves for each problem...")
+        solves = rebuild_problem_solves()
         for problem in api.problem.get_all_problems():
-            print(problem["name"], cache(get_problem_solves, problem["pid"]))
+            print(problem["name"], solves.get(problem["pid"], 0))
 
 
 if __name__ == "__main__":
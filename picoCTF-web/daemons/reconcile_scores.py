@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Verify the incrementally maintained scores against a full recompute."""
+
+import argparse
+
+import api
+from api.stats import reconcile_scores
+
+
+def run():
+    """Run the score reconciliation."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="replace mismatched cached scores with the recomputed ones",
+    )
+    args = parser.parse_args()
+
+    with api.create_app().app_context():
+        mismatches = reconcile_scores(fix=args.fix)
+        for mismatch in mismatches:
+            print("{key}: cached {cached}, expected {expected}".format(**mismatch))
+        print(
+            "{} mismatched score(s){}".format(
+                len(mismatches), ", fixed" if args.fix and mismatches else ""
+            )
+        )
+        if mismatches and not args.fix:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -90,7 +90,8 @@ setup(
             "pytest-cov",
             "pytest-mongo",
             "pytest-redis",
-        ]
+        ],
+        "msgpack": ["msgpack==1.0.0"],
     },
     entry_points={"console_scripts": ["daemon_manager=daemon_manager:main"]},
 )
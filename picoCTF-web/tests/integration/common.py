@@ -44,6 +44,9 @@ def clear_db():
     """Clear out the testing database."""
     db = get_conn()
     db.command("dropDatabase")
+    with app().app_context():
+        api.problem.bump_catalog_version()
+        api.cache.bump_version(api.config.SETTINGS_VERSION_KEY)
 
 
 @pytest.fixture
@@ -55,6 +58,8 @@ def client():
             "MONGO_DB_NAME": TESTING_DB_NAME,
             "MONGO_PORT": 27018,
             "RATE_LIMIT_BYPASS_KEY": RATE_LIMIT_BYPASS_KEY,
+            # Tests change the settings directly in the database
+            "SETTINGS_CACHE_TIMEOUT": 0,
         }
     )
     return app.test_client()
@@ -63,7 +68,12 @@ def client():
 def app():
     """Create an instance of the Flask app for testing."""
     app = api.create_app(
-        {"TESTING": True, "MONGO_DB_NAME": TESTING_DB_NAME, "MONGO_PORT": 27018}
+        {
+            "TESTING": True,
+            "MONGO_DB_NAME": TESTING_DB_NAME,
+            "MONGO_PORT": 27018,
+            "SETTINGS_CACHE_TIMEOUT": 0,
+        }
     )
     return app
 
@@ -709,6 +719,8 @@ def enable_sample_problems():
     """Enable any sample problems in the DB."""
     db = get_conn()
     db.problems.update_many({}, {"$set": {"disabled": False}})
+    with app().app_context():
+        api.problem.bump_catalog_version()
 
 
 def ensure_within_competition():
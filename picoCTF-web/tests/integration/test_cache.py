@@ -0,0 +1,133 @@
+"""Tests for the redis caching library."""
+import datetime
+import pickle
+import threading
+import time
+
+import pytest
+from pytest_mongo import factories
+from pytest_redis import factories
+from .common import client  # noqa (fixture)
+
+from api import cache
+
+calls = []
+
+
+@cache.memoize(local=True)
+def local_lookup(x):
+    calls.append(("local_lookup", x))
+    return {"x": x}
+
+
+@cache.memoize(tags=["team:{tid}"])
+def tagged_lookup(tid, x=None):
+    calls.append(("tagged_lookup", tid, x))
+    return [tid, x]
+
+
+@cache.memoize(single_flight=True)
+def slow_lookup(x):
+    calls.append(("slow_lookup", x))
+    time.sleep(0.5)
+    return x * 2
+
+
+@cache.memoize(timeout=60, early_refresh=1.0)
+def refreshed_lookup(x):
+    calls.append(("refreshed_lookup", x))
+    return "fresh"
+
+
+def count_calls(name):
+    return len([call for call in calls if call[0] == name])
+
+
+def test_local_cache_invalidation(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that local cache entries are dropped by another worker."""
+    with client.application.app_context():
+        assert local_lookup(1) == {"x": 1}
+        # Later lookups are served by this worker, even if redis drops the value
+        key = cache._make_key(local_lookup, (1,), {})
+        cache.get_cache().delete(key)
+        assert local_lookup(1) == {"x": 1}
+        assert count_calls("local_lookup") == 1
+
+        # Another worker invalidates the value through pub/sub
+        cache.get_conn().publish(cache.INVALIDATION_CHANNEL, key)
+        deadline = time.time() + 5
+        while count_calls("local_lookup") == 1 and time.time() < deadline:
+            time.sleep(0.05)
+            assert local_lookup(1) == {"x": 1}
+        assert count_calls("local_lookup") == 2
+
+
+def test_invalidate_tags(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that invalidating a tag drops every value recorded under it."""
+    with client.application.app_context():
+        tagged_lookup("tid1")
+        tagged_lookup("tid1", x=1)
+        tagged_lookup(tid="tid1", x=2)
+        tagged_lookup("tid2")
+        assert count_calls("tagged_lookup") == 4
+
+        cache.invalidate_tags("team:tid1")
+        tagged_lookup("tid1")
+        tagged_lookup("tid1", x=1)
+        tagged_lookup(tid="tid1", x=2)
+        tagged_lookup("tid2")
+        assert count_calls("tagged_lookup") == 7
+
+
+def test_single_flight(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that only one of several concurrent callers computes a value."""
+    results = []
+
+    def lookup():
+        with client.application.app_context():
+            results.append(slow_lookup(21))
+
+    threads = [threading.Thread(target=lookup) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [42] * 5
+    assert count_calls("slow_lookup") == 1
+
+
+def test_early_refresh(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that values which took long to compute are refreshed early."""
+    with client.application.app_context():
+        conn = cache.get_conn()
+        for x, delta in [(1, 0), (2, 1e9)]:
+            key = cache.get_cache().make_key(
+                cache._make_key(refreshed_lookup, (x,), {})
+            )
+            conn.set(key, cache._pack("stale", delta, time.time() + 60))
+
+        # Quick to compute, so kept until it expires
+        assert refreshed_lookup(1) == "stale"
+        # Slow to compute, so refreshed well before it expires
+        assert refreshed_lookup(2) == "fresh"
+        assert count_calls("refreshed_lookup") == 1
+
+
+@pytest.mark.parametrize("codec", list(cache.CODECS.values()))
+def test_codecs(codec):
+    """Test that values round trip through each codec and legacy formats."""
+    value = {
+        "name": "team",
+        "members": ["a", "b"],
+        "score": 1.5,
+        "when": datetime.datetime(2019, 1, 2, 3, 4, 5, 6000),
+        "missing": None,
+    }
+    raw = cache.ENVELOPE_MARKER + codec.dumps([value, 0.25, 100.0])
+    assert cache._unpack(raw) == (value, 0.25, 100.0)
+
+    # Values cached before compute times were recorded never expire,
+    # whatever their shape
+    legacy = ("value", 1, 2)
+    assert cache._unpack(pickle.dumps(legacy)) == (legacy, 0, None)
+    assert cache._unpack(codec.dumps(value)) == (value, 0, None)
@@ -0,0 +1,97 @@
+"""Tests for the /api/v1/problems endpoints."""
+from pytest_mongo import factories
+from pytest_redis import factories
+from .common import (  # noqa (fixture)
+    clear_db,
+    client,
+    get_csrf_token,
+    register_test_accounts,
+    STUDENT_DEMOGRAPHICS,
+    STUDENT_2_DEMOGRAPHICS,
+    load_sample_problems,
+    ensure_within_competition,
+    enable_sample_problems,
+    get_problem_key,
+)
+import api
+
+
+def test_bundle_dependencies(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that bundle dependencies lock problems until their thresholds."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    with client.application.app_context():
+        bid = api.bundles.get_all_bundles()[0]["bid"]
+        api.bundles.set_bundle_dependencies_enabled(bid, True)
+        problems = {
+            problem["name"]: problem for problem in api.problem.get_all_problems()
+        }
+        tid_2 = api.team.get_team(name=STUDENT_2_DEMOGRAPHICS["username"])["tid"]
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    # Problems with dependencies are locked until one of them is solved
+    res = client.get("/api/v1/problems")
+    assert [problem["name"] for problem in res.json] == ["Buffer Overflow 1"]
+    with client.application.app_context():
+        assert not api.problem.is_problem_unlocked(problems["ECB 1"], [])
+
+    pid = problems["Buffer Overflow 1"]["pid"]
+    res = client.post(
+        "/api/v1/submissions",
+        json={
+            "pid": pid,
+            "key": get_problem_key(pid, STUDENT_DEMOGRAPHICS["username"]),
+            "method": "testing",
+        },
+        headers=[("X-CSRF-Token", csrf_t)],
+    )
+    assert res.json["correct"] is True
+    res = client.get("/api/v1/problems")
+    assert sorted(problem["name"] for problem in res.json) == sorted(problems)
+    with client.application.app_context():
+        assert api.problem.is_problem_unlocked(
+            problems["ECB 1"], [problems["Buffer Overflow 1"]]
+        )
+
+        # Other teams stay locked, until the bundle's dependencies are disabled
+        assert api.problem.get_unlocked_pids(tid_2) == [pid]
+        api.bundles.set_bundle_dependencies_enabled(bid, False)
+        assert sorted(api.problem.get_unlocked_pids(tid_2)) == sorted(
+            problem["pid"] for problem in problems.values()
+        )
+        assert api.problem.is_problem_unlocked(problems["ECB 1"], [])
+
+
+def test_assign_instances_to_team(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that assigning instances never replaces a team's existing ones."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    with client.application.app_context():
+        pids = sorted(problem["pid"] for problem in api.problem.get_all_problems())
+        tid = api.team.get_team(name=STUDENT_DEMOGRAPHICS["username"])["tid"]
+        db = api.db.get_conn()
+        db.teams.update_one(
+            {"tid": tid}, {"$set": {"instances.{}".format(pids[0]): "existing"}}
+        )
+
+        # Only the problems without an instance are counted
+        assert api.problem.assign_instances_to_team(pids, tid) == len(pids) - 1
+        instances = db.teams.find_one({"tid": tid})["instances"]
+        assert instances[pids[0]] == "existing"
+        assert sorted(instances) == pids
+
+        # Assigning again changes nothing
+        assert api.problem.assign_instances_to_team(pids, tid) == 0
+        assert db.teams.find_one({"tid": tid})["instances"] == instances
@@ -1,11 +1,16 @@
 """Tests for the /api/v1/settings endpoint."""
+import pytest
 from pytest_mongo import factories
 from pytest_redis import factories
 from .common import (  # noqa (fixture)
     clear_db,
     client,
+    get_conn,
+    TESTING_DB_NAME,
 )
 
+import api
+
 
 def test_settings(mongo_proc, redis_proc, client):  # noqa
     """Test the /settings endpoint when not logged in as admin."""
@@ -25,3 +30,28 @@ def test_settings(mongo_proc, redis_proc, client):  # noqa
     assert res.status_code == 200
     for k, v in expected_responses.items():
         assert res.json[k] == v
+
+
+def test_settings_snapshot(mongo_proc, redis_proc):  # noqa
+    """Test that workers reuse the settings until they are changed."""
+    clear_db()
+    app = api.create_app(
+        {
+            "TESTING": True,
+            "MONGO_DB_NAME": TESTING_DB_NAME,
+            "MONGO_PORT": 27018,
+            "SETTINGS_CACHE_TIMEOUT": 60,
+        }
+    )
+    with app.app_context():
+        settings = api.config.get_settings()
+        assert settings["max_team_size"] == 5
+        with pytest.raises(TypeError):
+            settings["shell_servers"]["enable_sharding"] = True
+
+        # Writes outside of change_settings are only seen after the timeout
+        get_conn().settings.update_one({}, {"$set": {"max_team_size": 3}})
+        assert api.config.get_settings()["max_team_size"] == 5
+
+        api.config.change_settings({"max_team_size": 4})
+        assert api.config.get_settings()["max_team_size"] == 4
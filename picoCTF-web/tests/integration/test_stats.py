@@ -1,4 +1,9 @@
 """Tests for the /api/v1/stats endpoints."""
+import csv
+import datetime
+import io
+import json
+
 from pytest_mongo import factories
 from pytest_redis import factories
 from .common import (  # noqa (fixture)
@@ -32,6 +37,7 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     # Get the initial registration count
     res = client.get("/api/v1/stats/registration")
     assert res.status_code == 200
+    assert isinstance(res.json.pop("last_updated"), int)
     expected_response = {
         "groups": 0,
         "teamed_users": 0,
@@ -60,6 +66,7 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     cache(api.stats.get_registration_count)
     res = client.get("/api/v1/stats/registration")
     assert res.status_code == 200
+    res.json.pop("last_updated")
     expected_response["users"] += 1
     assert res.json == expected_response
 
@@ -79,6 +86,7 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     cache(api.stats.get_registration_count)
     res = client.get("/api/v1/stats/registration")
     assert res.status_code == 200
+    res.json.pop("last_updated")
     expected_response["teams"] += 1
     expected_response["teamed_users"] += 1
     assert res.json == expected_response
@@ -103,6 +111,7 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     cache(api.stats.get_registration_count)
     res = client.get("/api/v1/stats/registration")
     assert res.status_code == 200
+    res.json.pop("last_updated")
     expected_response["teamed_users"] += 1
     assert res.json == expected_response
 
@@ -125,5 +134,145 @@ def test_registration_stats(mongo_proc, redis_proc, client):
     cache(api.stats.get_registration_count)
     res = client.get("/api/v1/stats/registration")
     assert res.status_code == 200
+    res.json.pop("last_updated")
     expected_response["groups"] += 1
     assert res.json == expected_response
+
+
+def test_submission_stats(mongo_proc, redis_proc, client):
+    """Test the /stats/submissions endpoint."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    db = get_conn()
+    problems = sorted(db.problems.find({}, {"_id": 0}), key=lambda p: p["pid"])
+    first, second = problems[0], problems[1]
+    db.submissions.insert_many(
+        [
+            {
+                "pid": first["pid"],
+                "category": first["category"],
+                "correct": correct,
+                "timestamp": datetime.datetime(2019, 1, 1, hour),
+            }
+            for correct, hour in [(True, 1), (False, 2), (False, 3)]
+        ]
+        + [
+            {
+                "pid": second["pid"],
+                "category": second["category"],
+                "correct": True,
+                "timestamp": datetime.datetime(2019, 1, 1, 4),
+            }
+        ]
+    )
+
+    client.post(
+        "/api/v1/user/login",
+        json={
+            "username": ADMIN_DEMOGRAPHICS["username"],
+            "password": ADMIN_DEMOGRAPHICS["password"],
+        },
+    )
+    res = client.get("/api/v1/stats/submissions")
+    assert res.status_code == 200
+    assert len(res.json) == len(problems)
+    assert res.json[first["name"]] == {"valid": 1, "invalid": 2}
+    assert res.json[second["name"]] == {"valid": 1, "invalid": 0}
+    assert res.json[problems[2]["name"]] == {"valid": 0, "invalid": 0}
+
+    res = client.get(
+        "/api/v1/stats/submissions?start=2019-01-01T02:00:00Z"
+        + "&end=2019-01-01T04:00:00Z"
+    )
+    assert res.json[first["name"]] == {"valid": 0, "invalid": 2}
+    assert res.json[second["name"]] == {"valid": 0, "invalid": 0}
+
+    res = client.get("/api/v1/stats/submissions?by_category=true")
+    expected = {}
+    for problem, valid, invalid in [(first, 1, 2), (second, 1, 0)]:
+        counts = expected.setdefault(problem["category"], {"valid": 0, "invalid": 0})
+        counts["valid"] += valid
+        counts["invalid"] += invalid
+    assert res.json == expected
+
+
+def test_analytics_export(mongo_proc, redis_proc, client):
+    """Test the /stats/demographics and /stats/user_scores exports."""
+    clear_db()
+    register_test_accounts()
+    client.post(
+        "/api/v1/user/login",
+        json={
+            "username": ADMIN_DEMOGRAPHICS["username"],
+            "password": ADMIN_DEMOGRAPHICS["password"],
+        },
+    )
+
+    res = client.get("/api/v1/stats/demographics")
+    assert res.status_code == 200
+    demographics = res.json
+    assert len(demographics) == 5
+
+    res = client.get("/api/v1/stats/demographics?format=ndjson")
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    lines = res.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == demographics
+
+    res = client.get("/api/v1/stats/demographics?format=csv")
+    assert res.status_code == 200
+    assert res.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert [row["usertype"] for row in rows] == [d["usertype"] for d in demographics]
+
+    res = client.get("/api/v1/stats/user_scores?format=csv")
+    assert res.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(res.get_data(as_text=True))))
+    assert sorted(row["name"] for row in rows) == sorted(
+        user["username"]
+        for user in [
+            ADMIN_DEMOGRAPHICS,
+            TEACHER_DEMOGRAPHICS,
+            STUDENT_DEMOGRAPHICS,
+            STUDENT_2_DEMOGRAPHICS,
+            OTHER_USER_DEMOGRAPHICS,
+        ]
+    )
+    assert all(row["score"] == "0" for row in rows)
+
+
+def test_score_cache_races(mongo_proc, redis_proc, client):
+    """Test that a solve racing a score recompute is counted exactly once."""
+    clear_db()
+    with client.application.app_context():
+        weight = api.stats.get_time_weight(datetime.datetime.utcnow())
+
+        # Computed after the solve was submitted, cached before it was applied
+        assert api.cache.cache_score("tid1", 100 + weight, ["pid1"])
+        assert api.cache.increment_scores(["tid1"], "pid1", 100, weight) == 0
+        assert api.cache.get_score_cache().score("tid1") == 100 + weight
+
+        # Computed before the solve was submitted, cached after it was applied
+        assert api.cache.increment_scores(["tid2"], "pid1", 100, weight) == 0
+        assert not api.cache.cache_score("tid2", 0, [])
+        assert api.cache.get_score_cache().score("tid2") is None
+        assert api.cache.cache_score("tid2", 100 + weight, ["pid1"])
+
+        # Computed and cached before the solve was submitted
+        assert api.cache.cache_score("tid3", 0, [])
+        assert api.cache.increment_scores(["tid3"], "pid1", 100, weight) == 1
+        assert api.cache.get_score_cache().score("tid3") == 100 + weight
+
+        # Score progressions are appended to at most once per solve
+        key = api.cache.get_progression_key(tid="tid1")
+        assert api.cache.cache_progression(key, ["100:100"], ["pid1"], 60)
+        assert api.cache.append_progressions([key], "pid1", 100, 100, 60) == 0
+        key = api.cache.get_progression_key(tid="tid2")
+        assert api.cache.append_progressions([key], "pid1", 100, 100, 60) == 0
+        assert not api.cache.cache_progression(key, [], [], 60)
+        assert not api.cache.get_conn().exists(key)
+        key = api.cache.get_progression_key(tid="tid3")
+        assert api.cache.cache_progression(key, [], [], 60)
+        assert api.cache.append_progressions([key], "pid1", 100, 100, 60) == 1
+        assert api.cache.get_conn().lrange(key, 0, -1) == [b"start", b"100:100"]
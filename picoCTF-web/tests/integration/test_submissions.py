@@ -182,6 +182,318 @@ def test_submission(mongo_proc, redis_proc, client):  # noqa (fixture)
     )
 
 
+def solve_problem(client, csrf_t, problem):
+    """Submit the student's team's flag for a problem."""
+    res = client.post(
+        "/api/v1/submissions",
+        json={
+            "pid": problem["pid"],
+            "key": get_problem_key(problem["pid"], STUDENT_DEMOGRAPHICS["username"]),
+            "method": "testing",
+        },
+        headers=[("X-CSRF-Token", csrf_t)],
+    )
+    assert res.json["correct"] is True
+
+
+def test_submission_score(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that a correct submission updates the cached team score."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    # Cache the score and progression before solving anything
+    res = client.get("/api/v1/team")
+    assert res.json["score"] == 0
+    res = client.get("/api/v1/team/score_progression")
+    assert res.json == []
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    res = client.get("/api/v1/team")
+    assert res.json["score"] == problem["score"]
+    with client.application.app_context():
+        assert api.stats.reconcile_scores() == []
+
+    res = client.get("/api/v1/team/score_progression")
+    assert [point["score"] for point in res.json] == [problem["score"]]
+    solve_time = res.json[0]["time"]
+    res = client.get("/api/v1/team/score_progression?since={}".format(solve_time))
+    assert res.json == []
+
+
+def test_submission_solve_count(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that a correct submission updates the cached solve count."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    res = client.get("/api/v1/problems")
+    solves = {problem["pid"]: problem["solves"] for problem in res.json}
+    assert solves[problem["pid"]] == problem["solves"] + 1
+
+
+def test_submission_solves_backfill(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that correct submissions are recorded once in the solves collection."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    # The solve is recorded once, so the backfill has nothing to add
+    db = get_conn()
+    assert db.solves.count_documents({"pid": problem["pid"]}) == 1
+    with client.application.app_context():
+        assert api.submissions.rebuild_solves() == 0
+        db.solves.delete_many({})
+        assert api.submissions.rebuild_solves() == 1
+
+
+def test_submission_scoreboard(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that a correct submission updates the cached scoreboards."""
+    clear_db()
+    with client.application.app_context():
+        sid = api.scoreboards.add_scoreboard("Global")
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    scoreboard_url = "/api/v1/scoreboards/{}/scoreboard?page=1".format(sid)
+    res = client.get(scoreboard_url)
+    etag = res.headers["ETag"]
+    res = client.get(scoreboard_url, headers=[("If-None-Match", etag)])
+    assert res.status_code == 304
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    # The team shows up on its scoreboard without a rebuild
+    res = client.get(scoreboard_url, headers=[("If-None-Match", etag)])
+    assert res.status_code == 200
+    assert [(team["name"], team["score"]) for team in res.json["scoreboard"]] == [
+        (STUDENT_DEMOGRAPHICS["username"], problem["score"])
+    ]
+    etag = res.headers["ETag"]
+
+    # Versions do not restart from 1 when a board is rebuilt after a flush
+    with client.application.app_context():
+        api.cache.clear()
+        board = api.cache.get_scoreboard_cache(scoreboard_id=sid)
+        pipe = api.cache.get_conn().pipeline()
+        api.cache.replace_scoreboard(pipe, board, [])
+        pipe.execute()
+        version = api.cache.get_scoreboard_version(board)
+    assert version > int(etag.strip('"').split("-")[0])
+
+
+def test_submission_scoreboard_search(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that solving teams can be searched for on their scoreboards."""
+    clear_db()
+    with client.application.app_context():
+        sid = api.scoreboards.add_scoreboard("Global")
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    # Searches match anywhere in a name, or the start of a word for patterns
+    # shorter than a trigram
+    search_url = "/api/v1/scoreboards/{}/scoreboard?search={}"
+    for pattern in ["DENTuser", "st", "s"]:
+        res = client.get(search_url.format(sid, pattern))
+        assert [team["name"] for team in res.json["scoreboard"]] == [
+            STUDENT_DEMOGRAPHICS["username"]
+        ]
+    res = client.get(search_url.format(sid, "tu"))
+    assert res.json["scoreboard"] == []
+
+
+def test_submission_scoreboard_rename(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that renaming a solving team re-indexes it on its scoreboards."""
+    clear_db()
+    with client.application.app_context():
+        sid = api.scoreboards.add_scoreboard("Global")
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    solve_problem(client, csrf_t, problem)
+
+    with client.application.app_context():
+        tid = api.team.get_team(name=STUDENT_DEMOGRAPHICS["username"])["tid"]
+        api.team.update_team(tid, {"team_name": "renamedteam"})
+    search_url = "/api/v1/scoreboards/{}/scoreboard?search={}"
+    for pattern in ["DENTuser", "st"]:
+        res = client.get(search_url.format(sid, pattern))
+        assert res.json["scoreboard"] == []
+    for pattern in ["namedte", "re"]:
+        res = client.get(search_url.format(sid, pattern))
+        assert [team["name"] for team in res.json["scoreboard"]] == ["renamedteam"]
+
+
+def test_submission_uncached_score(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that a solve is counted on scoreboards when no score is cached."""
+    clear_db()
+    with client.application.app_context():
+        sid = api.scoreboards.add_scoreboard("Global")
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    # Browsing the problems caches the solved problems, but not the score
+    res = client.get("/api/v1/problems")
+    problem = sorted(res.json, key=lambda problem: problem["pid"])[0]
+    with client.application.app_context():
+        tid = api.team.get_team(name=STUDENT_DEMOGRAPHICS["username"])["tid"]
+        api.cache.invalidate(api.stats.get_score, tid)
+    solve_problem(client, csrf_t, problem)
+
+    res = client.get("/api/v1/scoreboards/{}/scoreboard?page=1".format(sid))
+    assert [(team["name"], team["score"]) for team in res.json["scoreboard"]] == [
+        (STUDENT_DEMOGRAPHICS["username"], problem["score"])
+    ]
+
+
+def test_suspicious_submission(mongo_proc, redis_proc, client):  # noqa (fixture)
+    """Test that submitting another instance's flag is flagged."""
+    clear_db()
+    register_test_accounts()
+    load_sample_problems()
+    enable_sample_problems()
+    ensure_within_competition()
+    res = client.post(
+        "/api/v1/user/login",
+        json={
+            "username": STUDENT_DEMOGRAPHICS["username"],
+            "password": STUDENT_DEMOGRAPHICS["password"],
+        },
+    )
+    csrf_t = get_csrf_token(res)
+
+    res = client.get("/api/v1/problems")
+    pid = res.json[0]["pid"]
+    db = get_conn()
+    assigned_flag = get_problem_key(pid, STUDENT_DEMOGRAPHICS["username"])
+    other_flag = next(
+        instance["flag"]
+        for instance in db.problems.find_one({"pid": pid})["instances"]
+        if instance["flag"] != assigned_flag
+    )
+    res = client.post(
+        "/api/v1/submissions",
+        json={"pid": pid, "key": "x" + other_flag + "x", "method": "testing"},
+        headers=[("X-CSRF-Token", csrf_t)],
+    )
+    assert res.json["correct"] is False
+    submission = db.submissions.find_one({"pid": pid}, {"_id": 0})
+    assert submission["suspicious"] is True
+
+    # The team assigned the other instance owns the submitted flag
+    other_iid = next(
+        instance["iid"]
+        for instance in db.problems.find_one({"pid": pid})["instances"]
+        if instance["flag"] == other_flag
+    )
+    db.teams.update_one(
+        {"team_name": OTHER_USER_DEMOGRAPHICS["username"]},
+        {"$set": {"instances.{}".format(pid): other_iid}},
+    )
+    with client.application.app_context():
+        suspicious = api.submissions.get_suspicious_submissions(submission["tid"])
+    assert [s["flag_owners"] for s in suspicious] == [
+        [OTHER_USER_DEMOGRAPHICS["username"]]
+    ]
+
+    # Both the team's own flag and another's within one key is correct
+    res = client.post(
+        "/api/v1/submissions",
+        json={"pid": pid, "key": other_flag + assigned_flag, "method": "testing"},
+        headers=[("X-CSRF-Token", csrf_t)],
+    )
+    assert res.json["correct"] is True
+
+
 def test_clear_all_submissions(mongo_proc, redis_proc, client):  # noqa (fixture)
     """Test the DELETE /submissions endpoint."""
     clear_db()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of the per-call overhead of api.cache.memoize.
+
+Compares deriving a cache key and serializing a typical value the old way
+(md5 of the pickled arguments, pickled value) with the current key encoding
+and value codecs. Does not need MongoDB or Redis.
+
+    python cache_overhead.py
+"""
+
+import datetime
+import hashlib
+import pickle
+import timeit
+
+from api.cache import _encode_key, CODECS
+
+RUNS = 20000
+
+TID = "6f0b8a32e7d94a8c9a4d3c1b2e5f7a90"
+UID = "0c9e7d15b3a2486f8e1d2c3b4a5f6e7d"
+
+# get_solved_problems(tid=..., uid=..., category=None) for a team with 40 solves
+SOLVED_PROBLEMS = [
+    {
+        "pid": "problem-{}_{}".format(i, "a" * 32),
+        "unique_name": "problem-{}_{}".format(i, "a" * 32),
+        "name": "Problem {}".format(i),
+        "score": 50 * (i % 10 + 1),
+        "category": "Category {}".format(i % 6),
+        "disabled": False,
+        "solved": True,
+        "unlocked": True,
+        "solve_time": datetime.datetime(2019, 10, 1) + datetime.timedelta(hours=i),
+    }
+    for i in range(40)
+]
+
+
+def old_key():
+    return hashlib.md5(
+        pickle.dumps(((), {"tid": TID, "uid": UID, "category": None}))
+    ).hexdigest()
+
+
+def new_key():
+    return _encode_key((), {"tid": TID, "uid": UID, "category": None})
+
+
+def old_value():
+    return pickle.loads(pickle.dumps(SOLVED_PROBLEMS, pickle.HIGHEST_PROTOCOL))
+
+
+def codec_value(codec):
+    def round_trip():
+        return codec.loads(codec.dumps([SOLVED_PROBLEMS, 0.01, None]))
+
+    return round_trip
+
+
+def report(name, fn):
+    per_call = timeit.timeit(fn, number=RUNS) / RUNS
+    print("{:<32} {:8.2f} us/call".format(name, per_call * 1e6))
+
+
+if __name__ == "__main__":
+    report("key: md5(pickle(args))", old_key)
+    report("key: encoded args", new_key)
+    report("value: pickle round trip", old_value)
+    for name, codec in CODECS.items():
+        report("value: {} codec round trip".format(name), codec_value(codec))